@@ -0,0 +1,195 @@
+import asyncio
+import bisect
+import itertools
+import math
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from config import (
+    ADMISSION_IDENTITY_QUEUE_SIZE,
+    ADMISSION_MAX_CONCURRENCY,
+    ADMISSION_MAX_CONCURRENCY_PER_IDENTITY,
+    ADMISSION_QUEUE_SIZE,
+    ADMISSION_QUEUE_TIMEOUT,
+)
+from metrics import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTED,
+    ADMISSION_WAIT_SECONDS,
+)
+from security import ANONYMOUS_IDENTITY
+
+# Lower rank is served first; unknown classes are treated as interactive.
+PRIORITY_RANKS = {"interactive": 0, "batch": 1}
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """A granted slot; release it when the request, or its stream, ends."""
+
+    def __init__(self, controller: "AdmissionController", identity: str):
+        self._controller = controller
+        self._identity = identity
+        self._granted_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(
+                self._identity, time.monotonic() - self._granted_at
+            )
+
+
+class _Waiter:
+    def __init__(self, identity: str, priority: str, future: asyncio.Future):
+        self.identity = identity
+        self.priority = priority
+        self.future = future
+
+
+class AdmissionController:
+    """Bounds concurrent requests globally and per caller identity.
+
+    Requests over either limit wait in a bounded queue ordered by priority
+    class, then arrival. A waiter is admitted as soon as a slot frees up for
+    both the server and its caller, so one caller at its own limit does not
+    hold up others queued behind it. Requests that would overflow the queue,
+    or that wait longer than ``queue_timeout``, are rejected with a
+    Retry-After estimate. Limits of 0 disable the respective check; the
+    per-identity limits do not apply to unauthenticated callers, who all
+    share one identity.
+
+    Must only be used from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+        max_concurrency_per_identity: int = ADMISSION_MAX_CONCURRENCY_PER_IDENTITY,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        identity_queue_size: int = ADMISSION_IDENTITY_QUEUE_SIZE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_identity = max_concurrency_per_identity
+        self.queue_size = queue_size
+        self.identity_queue_size = identity_queue_size
+        self.queue_timeout = queue_timeout
+        self._running = 0
+        self._running_by: Dict[str, int] = defaultdict(int)
+        self._queued_by: Dict[str, int] = defaultdict(int)
+        self._waiters: List[Tuple[int, int, _Waiter]] = []
+        self._sequence = itertools.count()
+        # Smoothed time a slot is held, used for Retry-After estimates.
+        self._hold_seconds = 1.0
+
+    def _has_capacity(self, identity: str) -> bool:
+        if self.max_concurrency and self._running >= self.max_concurrency:
+            return False
+        if (
+            self.max_concurrency_per_identity
+            and identity != ANONYMOUS_IDENTITY
+            and self._running_by[identity] >= self.max_concurrency_per_identity
+        ):
+            return False
+        return True
+
+    def _take_slot(self, identity: str) -> AdmissionTicket:
+        self._running += 1
+        self._running_by[identity] += 1
+        ADMISSION_IN_FLIGHT.inc()
+        return AdmissionTicket(self, identity)
+
+    def retry_after(self) -> int:
+        slots = self.max_concurrency or max(self._running, 1)
+        return max(1, math.ceil(self._hold_seconds * (len(self._waiters) + 1) / slots))
+
+    def _reject(self, reason: str, priority: str) -> AdmissionRejected:
+        ADMISSION_REJECTED.labels(reason, priority).inc()
+        return AdmissionRejected(reason, self.retry_after())
+
+    async def acquire(self, identity: str, priority: str) -> AdmissionTicket:
+        if priority not in PRIORITY_RANKS:
+            priority = "interactive"
+        if self._has_capacity(identity):
+            ADMISSION_WAIT_SECONDS.labels(priority).observe(0.0)
+            return self._take_slot(identity)
+        if self.queue_size and len(self._waiters) >= self.queue_size:
+            raise self._reject("queue_full", priority)
+        if (
+            self.identity_queue_size
+            and identity != ANONYMOUS_IDENTITY
+            and self._queued_by[identity] >= self.identity_queue_size
+        ):
+            raise self._reject("identity_queue_full", priority)
+        waiter = _Waiter(identity, priority, asyncio.get_running_loop().create_future())
+        entry = (PRIORITY_RANKS[priority], next(self._sequence), waiter)
+        bisect.insort(self._waiters, entry, key=lambda e: e[:2])
+        self._queued_by[identity] += 1
+        ADMISSION_QUEUE_DEPTH.labels(priority).inc()
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(waiter.future, self.queue_timeout or None)
+        except asyncio.TimeoutError:
+            self._dequeue(entry)
+            raise self._reject("queue_timeout", priority)
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                waiter.future.result().release()
+            self._dequeue(entry)
+            raise
+        finally:
+            ADMISSION_WAIT_SECONDS.labels(priority).observe(
+                time.perf_counter() - started
+            )
+
+    def _dequeue(self, entry: Tuple[int, int, _Waiter]):
+        try:
+            self._waiters.remove(entry)
+        except ValueError:
+            return
+        waiter = entry[2]
+        self._queued_by[waiter.identity] -= 1
+        if not self._queued_by[waiter.identity]:
+            del self._queued_by[waiter.identity]
+        ADMISSION_QUEUE_DEPTH.labels(waiter.priority).dec()
+
+    def _release(self, identity: str, held: float):
+        self._running -= 1
+        self._running_by[identity] -= 1
+        if not self._running_by[identity]:
+            del self._running_by[identity]
+        ADMISSION_IN_FLIGHT.dec()
+        self._hold_seconds += 0.1 * (held - self._hold_seconds)
+        self._dispatch()
+
+    def _dispatch(self):
+        index = 0
+        while index < len(self._waiters):
+            if self.max_concurrency and self._running >= self.max_concurrency:
+                return
+            entry = self._waiters[index]
+            waiter = entry[2]
+            if waiter.future.done():
+                self._dequeue(entry)
+                continue
+            if self._has_capacity(waiter.identity):
+                self._dequeue(entry)
+                waiter.future.set_result(self._take_slot(waiter.identity))
+                continue
+            index += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"running": self._running, "queued": len(self._waiters)}
+
+
+admission_controller = AdmissionController()
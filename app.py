@@ -1,42 +1,161 @@
-import json
+import asyncio
 import logging
 import time
 import uuid
+from contextlib import asynccontextmanager
 from typing import Any, Dict, Optional
 
-from fastapi import Depends, FastAPI, Header
-from fastapi.responses import JSONResponse, Response, StreamingResponse
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
 
-from llm_utils import get_llm_stream, get_llm_sync
+from admission import AdmissionRejected, admission_controller
+from batch import call_with_backoff, run_bounded
+from checkpoints import aclose_checkpointer
+from config import (
+    ADMISSION_PRIORITY_HEADER,
+    AGENT_MODEL,
+    AGENT_TOOLS,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_MAX_ITEMS,
+    PRELOAD_ON_STARTUP,
+    ROUTER_ENABLED,
+    WATSONX_API_KEY,
+)
+from graph_cache import preload_agent_graph
+from hedging import model_hedger
+from http_clients import aclose_clients
+from llm_clients import preload_provider
+from llm_utils import get_llm_async, get_llm_stream
+from log_utils import Truncated, setup_logging
+from metrics import (
+    REQUEST_PARSE_SECONDS,
+    REQUEST_SECONDS,
+    model_label,
+    render_metrics,
+)
 from models import (
     DEFAULT_MODEL,
+    BatchCompletionRequest,
+    BatchCompletionResponse,
+    BatchCompletionResult,
     ChatCompletionRequest,
     ChatCompletionResponse,
     Choice,
     MessageResponse,
 )
-from security import get_current_user
-from tools import (
-    get_currency_exchange,
-    news_search_duckduckgo,
-    tavily_search,
-    web_search_duckduckgo,
-)
+from responses import FastJSONResponse, json_bytes
+from router import model_router
+from security import caller_identity, get_current_user
+from token_budget import preload_tokenizers
+from token_utils import get_token_manager
+from tools import preload_tools, tool_choices
 
+setup_logging()
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
 
-app = FastAPI()
+
+def warm_up(model: str):
+    """Loads what the configured model and tools need, logging each step."""
+    steps = [("tokenizer", lambda: preload_tokenizers(model))]
+    if PRELOAD_ON_STARTUP:
+        steps += [
+            ("provider", lambda: preload_provider(model)),
+            ("tools", lambda: preload_tools(AGENT_TOOLS)),
+            ("agent_graph", preload_agent_graph),
+        ]
+    timings = []
+    for name, step in steps:
+        started = time.perf_counter()
+        step()
+        timings.append(f"{name}={time.perf_counter() - started:.3f}s")
+    logger.info("Startup warm-up: %s", " ".join(timings))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    token_manager = None
+    if WATSONX_API_KEY:
+        token_manager = get_token_manager(WATSONX_API_KEY)
+        token_manager.start_background_refresh()
+    await asyncio.to_thread(warm_up, AGENT_MODEL or DEFAULT_MODEL)
+    yield
+    if token_manager:
+        await token_manager.stop_background_refresh()
+    await aclose_checkpointer()
+    await aclose_clients()
+    model_hedger.shutdown()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+
+class ReceiveTimeMiddleware:
+    """Stamps ``request.state.received_at`` as a plain ASGI middleware, so
+    requests and streamed bodies pass through without an extra task."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            scope.setdefault("state", {})["received_at"] = time.perf_counter()
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(ReceiveTimeMiddleware)
+
+
+async def observe_stream(frames, started: float, label: str, ticket):
+    try:
+        async for frame in frames:
+            yield frame
+    finally:
+        ticket.release()
+        REQUEST_SECONDS.labels(label, "true").observe(time.perf_counter() - started)
+
+
+@app.get("/metrics")
+async def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
+
+def select_model(request: ChatCompletionRequest) -> str:
+    # The requested model or group is honoured only when the router can
+    # serve it; otherwise the server's configured model is used.
+    if ROUTER_ENABLED and not AGENT_MODEL and model_router.routes(request.model):
+        return request.model
+    return AGENT_MODEL or DEFAULT_MODEL
+
+
+async def _complete(
+    request: ChatCompletionRequest, model: str, thread_id: str, tools
+) -> ChatCompletionResponse:
+    last_message, all_messages = await get_llm_async(
+        request.messages, model, thread_id, tools
+    )
+    id = str(uuid.uuid4())
+    return ChatCompletionResponse(
+        id=id,
+        object="chat.completion",
+        created=int(time.time()),
+        # model=request.model,
+        model=model,
+        choices=[
+            Choice(
+                index=0,
+                message=MessageResponse(role="assistant", content=last_message),
+                finish_reason="stop",
+            )
+        ],
+    )
 
 
 @app.post("/chat/completions")
 async def chat_completions(
     request: ChatCompletionRequest,
+    http_request: Request,
     X_IBM_THREAD_ID: Optional[str] = Header(
         None,
         alias="X-IBM-THREAD-ID",
@@ -44,51 +163,108 @@ async def chat_completions(
     ),
     current_user: Dict[str, Any] = Depends(get_current_user),
 ):
+    started = http_request.state.received_at
+    REQUEST_PARSE_SECONDS.observe(time.perf_counter() - started)
     logger.info(
-        f"Received POST /chat/completions ChatCompletionRequest: {request.json()}"
+        "Received POST /chat/completions ChatCompletionRequest: %s",
+        Truncated(request.model_dump_json),
     )
     thread_id = ""
     if X_IBM_THREAD_ID:
         thread_id = X_IBM_THREAD_ID
     if request.extra_body and request.extra_body.thread_id:
         thread_id = request.extra_body.thread_id
-    logger.info("thread_id: " + thread_id)
-    model = DEFAULT_MODEL
-    # if request.model:
-    #     model = request.model
-    # selected_tools = [web_search_duckduckgo, news_search_duckduckgo]
-    # selected_tools = [tavily_search]
-    selected_tools = [get_currency_exchange]
+    logger.info("thread_id: %s", thread_id)
+    model = select_model(request)
+    selected_tools = [tool_choices[name] for name in AGENT_TOOLS]
+    try:
+        ticket = await admission_controller.acquire(
+            caller_identity(current_user),
+            http_request.headers.get(ADMISSION_PRIORITY_HEADER, "interactive"),
+        )
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests ({e.reason})",
+            headers={"Retry-After": str(e.retry_after)},
+        )
     if request.stream:
+        frames = get_llm_stream(request.messages, model, thread_id, selected_tools)
+        # The stream releases its slot when it ends; the background task
+        # covers responses that are never iterated, e.g. early disconnects.
         return StreamingResponse(
-            get_llm_stream(request.messages, model, thread_id, selected_tools),
+            observe_stream(frames, started, model_label(model), ticket),
             media_type="text/event-stream",
+            background=BackgroundTask(ticket.release),
         )
     else:
-        last_message, all_messages = get_llm_sync(
-            request.messages, model, thread_id, selected_tools
+        try:
+            response = await _complete(request, model, thread_id, selected_tools)
+        finally:
+            ticket.release()
+        rendered = FastJSONResponse(response)
+        REQUEST_SECONDS.labels(model_label(model), "false").observe(
+            time.perf_counter() - started
         )
-        id = str(uuid.uuid4())
-        response = ChatCompletionResponse(
-            id=id,
-            object="chat.completion",
-            created=int(time.time()),
-            # model=request.model,
-            model=model,
-            choices=[
-                Choice(
-                    index=0,
-                    message=MessageResponse(role="assistant", content=last_message),
-                    finish_reason="stop",
-                )
-            ],
-        )
-        json_content = json.dumps(response.dict(), ensure_ascii=False)
-        return Response(
-            content=json_content,
-            media_type="application/json; charset=utf-8",
-            headers={"Content-Type": "application/json; charset=utf-8"},
+        return rendered
+
+
+@app.post("/chat/completions/batch")
+async def chat_completions_batch(
+    batch: BatchCompletionRequest,
+    http_request: Request,
+    current_user: Dict[str, Any] = Depends(get_current_user),
+):
+    """Runs independent completions with bounded parallelism.
+
+    Each request takes a "batch" priority admission slot while it runs and
+    starts under the shared upstream rate limit. With ``stream`` (the
+    default) results are written as NDJSON lines in completion order,
+    otherwise returned together in request order.
+    """
+    if len(batch.requests) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch can hold at most {BATCH_MAX_ITEMS} requests",
         )
+    logger.info("Received POST /chat/completions/batch of %d", len(batch.requests))
+    selected_tools = [tool_choices[name] for name in AGENT_TOOLS]
+    identity = caller_identity(current_user)
+    concurrency = min(
+        batch.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY
+    )
+
+    async def run_one(request: ChatCompletionRequest) -> ChatCompletionResponse:
+        thread_id = request.extra_body.thread_id if request.extra_body else ""
+
+        async def attempt():
+            ticket = await admission_controller.acquire(identity, "batch")
+            try:
+                return await _complete(
+                    request, select_model(request), thread_id or "", selected_tools
+                )
+            finally:
+                ticket.release()
+
+        return await call_with_backoff(attempt)
+
+    def result(index: int, response, error) -> BatchCompletionResult:
+        if error is not None:
+            logger.error("Batch request %d failed: %s", index, error)
+            return BatchCompletionResult(index=index, error=str(error))
+        return BatchCompletionResult(index=index, response=response)
+
+    results = run_bounded(batch.requests, run_one, max(concurrency, 1))
+    if batch.stream:
+
+        async def lines():
+            async for index, response, error in results:
+                yield json_bytes(result(index, response, error)) + b"\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+    collected = [result(*finished) async for finished in results]
+    collected.sort(key=lambda r: r.index)
+    return FastJSONResponse(BatchCompletionResponse(results=collected))
 
 
 if __name__ == "__main__":
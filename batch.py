@@ -0,0 +1,105 @@
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Sequence, Tuple
+
+from admission import AdmissionRejected
+from config import BATCH_MAX_RETRIES, BATCH_MAX_RPS
+
+logger = logging.getLogger()
+
+
+class TokenBucket:
+    """Async rate limiter shared by all batches in the process.
+
+    ``pause`` holds every caller back, e.g. after the upstream signalled a
+    rate limit. A rate of 0 disables the limit (pauses still apply).
+    """
+
+    def __init__(self, rate: float = BATCH_MAX_RPS, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                if not self.rate:
+                    return
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+upstream_rate = TokenBucket()
+
+
+def _retry_delay(error: Exception, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying after ``error``, None if not retryable."""
+    if isinstance(error, AdmissionRejected):
+        return float(error.retry_after)
+    if getattr(error, "status_code", None) == 429 or "rate limit" in str(error).lower():
+        return min(2.0**attempt, 30.0)
+    return None
+
+
+async def call_with_backoff(func: Callable[[], Awaitable[Any]]) -> Any:
+    """Runs ``func`` under the upstream rate limit, retrying on rate limits."""
+    attempt = 0
+    while True:
+        await upstream_rate.acquire()
+        try:
+            return await func()
+        except Exception as e:
+            delay = _retry_delay(e, attempt)
+            if delay is None or attempt >= BATCH_MAX_RETRIES:
+                raise
+            logger.warning("Rate limited, retrying batch item in %.1fs: %s", delay, e)
+            if not isinstance(e, AdmissionRejected):
+                upstream_rate.pause(delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+async def run_bounded(
+    items: Sequence[Any],
+    worker: Callable[[Any], Awaitable[Any]],
+    concurrency: int,
+) -> AsyncIterator[Tuple[int, Any, Optional[Exception]]]:
+    """Runs ``worker`` over ``items`` with at most ``concurrency`` in flight.
+
+    Yields (index, result, error) as each item finishes. Items not yet
+    finished are cancelled if the consumer stops early.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    done: asyncio.Queue = asyncio.Queue()
+
+    async def run(index: int, item: Any):
+        async with semaphore:
+            try:
+                done.put_nowait((index, await worker(item), None))
+            except Exception as e:
+                done.put_nowait((index, None, e))
+
+    tasks = [asyncio.create_task(run(i, item)) for i, item in enumerate(items)]
+    try:
+        for _ in range(len(tasks)):
+            yield await done.get()
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,215 @@
+"""Microbenchmark of request parsing and message conversion.
+
+Builds chat histories of 10 to 1000 messages (a quarter of the assistant
+turns call a tool) and times, per history on a single core:
+
+- parse: validating the JSON body into ``ChatCompletionRequest``
+- baseline: the previous if-chain conversion plus ``validate_chat_history``
+- convert: ``message_conversion.convert_messages``
+- cached: the same with the prefix cache, for a history that extends one
+  already seen by one turn (the usual multi-turn request)
+
+    python -m benchmarks.bench_messages --sizes 10,100,1000
+"""
+
+import argparse
+import json
+import time
+
+from langchain_core.messages import (
+    AIMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolCall,
+    ToolMessage,
+)
+
+import message_conversion
+from message_conversion import MessagePrefixCache, convert_messages
+from models import ChatCompletionRequest
+
+
+def history(size: int, missing_responses: int = 0):
+    """Request messages: a system prompt, then user/assistant turns with
+    tool calls; the last ``missing_responses`` tool calls are unanswered."""
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    turn = 0
+    while len(messages) < size:
+        messages.append({"role": "user", "content": f"Question {turn}: " + "ab " * 40})
+        if turn % 4 == 3:
+            call_id = f"call_{turn}"
+            arguments = {"query": f"exchange rate {turn}", "currencies": ["KRW"]}
+            messages.append(
+                {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {
+                            "id": call_id,
+                            "type": "function",
+                            "function": {
+                                "name": "get_currency_exchange",
+                                "arguments": json.dumps(arguments),
+                            },
+                        }
+                    ],
+                }
+            )
+            messages.append(
+                {"role": "tool", "tool_call_id": call_id, "content": "1 USD = 1300 KRW"}
+            )
+        messages.append({"role": "assistant", "content": "Answer " + "cd " * 60})
+        turn += 1
+    messages = messages[:size]
+    dropped = 0
+    for index in range(len(messages) - 1, -1, -1):
+        if dropped == missing_responses:
+            break
+        if messages[index]["role"] == "tool":
+            del messages[index]
+            dropped += 1
+    return messages
+
+
+def parse(body: str):
+    return ChatCompletionRequest.model_validate_json(body).messages
+
+
+def convert_baseline(messages):
+    """The conversion and history validation this benchmark replaced."""
+    converted = []
+    for msg in messages:
+        role = msg.role
+        if role.lower() == "user" or role.lower() == "human":
+            new_message = HumanMessage(content=msg.content)
+        if role.lower() == "system":
+            new_message = SystemMessage(content=msg.content)
+        if role.lower() == "assistant":
+            content = msg.content or ""
+            if msg.tool_calls:
+                tool_calls = [
+                    ToolCall(
+                        name=call.function.name,
+                        args=call.function.arguments,
+                        id=call.id,
+                        type="tool",
+                    )
+                    for call in msg.tool_calls
+                ]
+                new_message = AIMessage(
+                    content=content, tool_calls=tool_calls, additional_kwargs={}
+                )
+            else:
+                new_message = AIMessage(content=content, additional_kwargs={})
+        if role.lower() == "tool":
+            new_message = ToolMessage(
+                content=msg.content, name=None, tool_call_id=msg.tool_call_id
+            )
+        converted.append(new_message)
+    tool_call_ids = set()
+    for msg in converted:
+        if isinstance(msg, AIMessage) and msg.tool_calls:
+            for tool_call in msg.tool_calls:
+                tool_call_ids.add(tool_call.get("id"))
+    for msg in converted:
+        if isinstance(msg, ToolMessage) and msg.tool_call_id in tool_call_ids:
+            tool_call_ids.remove(msg.tool_call_id)
+    for tool_call_id in tool_call_ids:
+        converted.append(
+            ToolMessage(
+                content=message_conversion.PLACEHOLDER_CONTENT,
+                tool_call_id=tool_call_id,
+                name="unknown",
+            )
+        )
+    return converted
+
+
+def _comparable(messages):
+    return [
+        (type(m).__name__, m.content, getattr(m, "tool_call_id", None))
+        + tuple((c["id"], c["name"], c["args"]) for c in getattr(m, "tool_calls", []))
+        for m in messages
+    ]
+
+
+def check_equivalence():
+    messages = parse(json.dumps({"messages": history(60, missing_responses=3)}))
+    expected = convert_baseline(messages)
+    # Placeholders used to be appended in set order.
+    assert sorted(_comparable(convert_messages(messages))) == sorted(
+        _comparable(expected)
+    )
+    cache = MessagePrefixCache()
+    message_conversion.message_prefix_cache = cache
+    message_conversion.MESSAGE_PREFIX_CACHE_ENABLED = True
+    for _ in range(2):
+        cached = convert_messages(messages, use_cache=True)
+        assert sorted(_comparable(cached)) == sorted(_comparable(expected))
+        assert len({m.id for m in cached if m.id}) == len(messages)
+    assert cache.hits == len(messages)
+
+
+def seconds_per_call(func, *args, repeat=7, min_time=0.5) -> float:
+    loops = 1
+    while True:
+        start = time.process_time()
+        for _ in range(loops):
+            func(*args)
+        if time.process_time() - start >= min_time / repeat:
+            break
+        loops *= 2
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        for _ in range(loops):
+            func(*args)
+        best = min(best, (time.process_time() - start) / loops)
+    return best
+
+
+def main(args):
+    check_equivalence()
+    message_conversion.MESSAGE_PREFIX_CACHE_ENABLED = True
+    print(
+        f"{'messages':>8} {'parse':>10} {'baseline':>10} {'convert':>10} "
+        f"{'cached':>10} {'speedup':>8} {'cached':>8}"
+    )
+    for size in args.sizes:
+        body = json.dumps({"messages": history(size)})
+        messages = parse(body)
+        earlier = messages[: max(size - 2, 1)]
+        cache = MessagePrefixCache(max_entries=size * 2)
+        message_conversion.message_prefix_cache = cache
+
+        def convert_extended():
+            # Each run starts from a cache holding only the earlier turn.
+            cache.clear()
+            convert_messages(earlier, use_cache=True)
+            started = time.process_time()
+            convert_messages(messages, use_cache=True)
+            return time.process_time() - started
+
+        parsed = seconds_per_call(parse, body)
+        baseline = seconds_per_call(convert_baseline, messages)
+        converted = seconds_per_call(convert_messages, messages)
+        cached = min(convert_extended() for _ in range(max(20, 2000 // size)))
+        print(
+            f"{size:>8} {parsed * 1000:>8.3f}ms {baseline * 1000:>8.3f}ms "
+            f"{converted * 1000:>8.3f}ms {cached * 1000:>8.3f}ms "
+            f"{baseline / converted:>7.2f}x {baseline / cached:>7.2f}x"
+        )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[10, 100, 1000],
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
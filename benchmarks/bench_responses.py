@@ -0,0 +1,118 @@
+"""Microbenchmark of non-stream completion response serialization.
+
+Compares, for a small and a large (Korean) answer on a single core:
+
+- dict + json.dumps: the previous ``response.dict()`` / ``json.dumps`` path
+- jsonable_encoder: what FastAPI does with a model returned from an endpoint
+- FastJSONResponse with each of the orjson and pydantic backends
+
+    python -m benchmarks.bench_responses
+"""
+
+import json
+import time
+import warnings
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+import responses
+from models import ChatCompletionResponse, Choice, MessageResponse
+from responses import FastJSONResponse
+
+ANSWERS = {
+    "small": "원/달러 환율은 1,300원입니다. The rate is 1300 KRW.",
+    "large": "원/달러 환율은 다음과 같습니다. The rate is 1300 KRW.\n" * 400,
+}
+
+
+def completion(answer: str) -> ChatCompletionResponse:
+    return ChatCompletionResponse(
+        id="5d6f0b8e-2c1a-4c4e-9a53-6c1b4c7e2f10",
+        created=int(time.time()),
+        model="gpt-4o",
+        choices=[
+            Choice(
+                index=0,
+                message=MessageResponse(role="assistant", content=answer),
+                finish_reason="stop",
+            )
+        ],
+    )
+
+
+def with_dict_dumps(response):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        content = json.dumps(response.dict(), ensure_ascii=False)
+    return Response(
+        content=content,
+        media_type="application/json; charset=utf-8",
+        headers={"Content-Type": "application/json; charset=utf-8"},
+    )
+
+
+def with_jsonable_encoder(response):
+    return JSONResponse(jsonable_encoder(response))
+
+
+with_dict_dumps.__name__ = "dict + json.dumps"
+with_jsonable_encoder.__name__ = "jsonable_encoder"
+
+
+def with_backend(backend: str):
+    def render(response):
+        responses.RESPONSE_JSON_BACKEND = backend
+        return FastJSONResponse(response)
+
+    render.__name__ = f"FastJSONResponse ({backend})"
+    return render
+
+
+def check_equivalence(response):
+    expected = json.loads(with_dict_dumps(response).body)
+    for backend in ("orjson", "pydantic"):
+        rendered = with_backend(backend)(response)
+        assert json.loads(rendered.body) == expected, backend
+        assert rendered.headers["content-type"] == "application/json; charset=utf-8"
+
+
+def responses_per_second(func, response, repeat=7, min_time=0.5) -> float:
+    loops = 1
+    while True:
+        start = time.process_time()
+        for _ in range(loops):
+            func(response)
+        if time.process_time() - start >= min_time / repeat:
+            break
+        loops *= 2
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        for _ in range(loops):
+            func(response)
+        best = min(best, (time.process_time() - start) / loops)
+    return 1 / best
+
+
+if __name__ == "__main__":
+    if responses.orjson is None:
+        print("orjson is not installed; its row measures the pydantic backend")
+    paths = [
+        with_dict_dumps,
+        with_jsonable_encoder,
+        with_backend("orjson"),
+        with_backend("pydantic"),
+    ]
+    for size, answer in ANSWERS.items():
+        response = completion(answer)
+        check_equivalence(response)
+        print(f"{size} answer ({len(answer):,} chars):")
+        baseline = None
+        for path in paths:
+            rate = responses_per_second(path, response)
+            baseline = baseline or rate
+            print(
+                f"  {path.__name__:28} {rate:12,.0f} responses/s/core"
+                f"  {rate / baseline:6.2f}x"
+            )
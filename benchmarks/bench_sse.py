@@ -0,0 +1,70 @@
+"""Microbenchmark of SSE frame encoding in get_llm_stream.
+
+Compares the per-token dict + json.dumps path (format_resp) with
+sse.StreamFrameEncoder on a single core.
+
+    python -m benchmarks.bench_sse
+"""
+
+import json
+import time
+import uuid
+
+from llm_utils import format_resp
+from sse import StreamFrameEncoder
+
+THREAD_ID = "bench-thread"
+MODEL = "gpt-4o"
+TOKENS = ["Hello", " 세계", ", ", "this", ' is "quoted"', " text\n", " 😀"] * 2000
+
+
+def encode_with_dicts(tokens):
+    for content in tokens:
+        struct = {
+            "id": str(uuid.uuid4()),
+            "object": "thread.message.delta",
+            "created": int(time.time()),
+            "thread_id": THREAD_ID,
+            "model": MODEL,
+            "choices": [{"delta": {"content": content, "role": "assistant"}}],
+        }
+        format_resp(struct)
+
+
+def encode_with_encoder(tokens):
+    encoder = StreamFrameEncoder(THREAD_ID, MODEL)
+    for content in tokens:
+        encoder.content(content)
+
+
+def check_equivalence():
+    encoder = StreamFrameEncoder(THREAD_ID, MODEL)
+    for content in TOKENS[:7]:
+        frame = json.loads(encoder.content(content)[len("data: ") :])
+        frame.pop("id")
+        expected = {
+            "object": "thread.message.delta",
+            "created": frame["created"],
+            "thread_id": THREAD_ID,
+            "model": MODEL,
+            "choices": [{"delta": {"content": content, "role": "assistant"}}],
+        }
+        assert frame == expected, (frame, expected)
+
+
+def frames_per_second(func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        func(TOKENS)
+        best = min(best, time.process_time() - start)
+    return len(TOKENS) / best
+
+
+if __name__ == "__main__":
+    check_equivalence()
+    baseline = frames_per_second(encode_with_dicts)
+    encoded = frames_per_second(encode_with_encoder)
+    print(f"format_resp:        {baseline:12,.0f} frames/s/core")
+    print(f"StreamFrameEncoder: {encoded:12,.0f} frames/s/core")
+    print(f"speedup:            {encoded / baseline:12.2f}x")
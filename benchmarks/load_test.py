@@ -0,0 +1,229 @@
+"""Load and latency benchmark of /chat/completions against a local stub model.
+
+Runs the FastAPI app in-process by driving its ASGI interface directly, so
+no network or upstream credentials are needed. For each mode (stream and
+non-stream) and concurrency level it reports requests per second, p50/p95/p99
+latency, time to first token and server CPU per streamed token, and writes
+the results as JSON for comparison across releases.
+
+    python -m benchmarks.load_test --concurrency 1,8,32 --requests 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Dict, List
+
+RESPONSE_TOKEN_MARKER = b'"thread.message.delta"'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--modes", default="stream,nonstream")
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--token-rate", type=float, default=200.0)
+    parser.add_argument("--first-token-latency", type=float, default=0.05)
+    parser.add_argument("--tool-calls", type=int, default=1)
+    parser.add_argument("--tool-latency", type=float, default=0.05)
+    parser.add_argument("--history", type=int, default=1)
+    parser.add_argument("--output", default="bench_results.json")
+    return parser.parse_args()
+
+
+def configure_environment():
+    os.environ.setdefault("AGENT_MODEL", "stub/chat")
+    os.environ.setdefault("AGENT_TOOLS", "stub_search")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # All benchmark requests share one API key.
+    os.environ.setdefault("ADMISSION_MAX_CONCURRENCY_PER_IDENTITY", "0")
+
+
+def install_stubs(args):
+    import tools
+    from benchmarks.stub_model import StubChatModel, make_stub_tool
+    from llm_clients import register_provider
+
+    def build(model: str, overrides: Dict):
+        return StubChatModel(
+            tokens=args.tokens,
+            token_rate=args.token_rate,
+            first_token_latency=args.first_token_latency,
+            tool_calls=args.tool_calls,
+        )
+
+    register_provider("stub", build)
+    tools.tool_choices["stub_search"] = make_stub_tool(args.tool_latency)
+
+
+def request_body(history: int, stream: bool, index: int) -> bytes:
+    messages = []
+    for turn in range(history - 1):
+        messages.append({"role": "user", "content": f"earlier question {turn}"})
+        messages.append({"role": "assistant", "content": f"earlier answer {turn}"})
+    messages.append({"role": "user", "content": f"benchmark question {index}"})
+    return json.dumps({"messages": messages, "stream": stream}).encode()
+
+
+async def call_app(app, body: bytes) -> Dict[str, float]:
+    """Sends one request through the ASGI interface and times the response."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/chat/completions",
+        "raw_path": b"/chat/completions",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"x-api-key", b"benchmark"),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+    finished = asyncio.Event()
+    request_sent = False
+    timings = {"status": 0, "first_token": None}
+    started = time.perf_counter()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            timings["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            if timings["first_token"] is None and (
+                RESPONSE_TOKEN_MARKER in chunk or b'"chat.completion"' in chunk
+            ):
+                timings["first_token"] = time.perf_counter() - started
+            if not message.get("more_body", False):
+                finished.set()
+
+    await app(scope, receive, send)
+    finished.set()
+    timings["latency"] = time.perf_counter() - started
+    return timings
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(name: str, values: List[float]) -> Dict[str, float]:
+    return {
+        f"{name}_p50_ms": percentile(values, 0.50) * 1000,
+        f"{name}_p95_ms": percentile(values, 0.95) * 1000,
+        f"{name}_p99_ms": percentile(values, 0.99) * 1000,
+    }
+
+
+async def run_level(app, args, stream: bool, concurrency: int) -> Dict:
+    from benchmarks.stub_model import TokenCounter
+
+    bodies = [request_body(args.history, stream, i) for i in range(args.requests)]
+    queue: asyncio.Queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+    results = []
+
+    async def worker():
+        while not queue.empty():
+            results.append(await call_app(app, queue.get_nowait()))
+
+    tokens_before = TokenCounter.value
+    cpu_before = time.process_time()
+    wall_before = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - wall_before
+    cpu = time.process_time() - cpu_before
+    tokens = TokenCounter.value - tokens_before
+
+    errors = sum(1 for r in results if r["status"] != 200)
+    latencies = [r["latency"] for r in results]
+    first_tokens = [r["first_token"] for r in results if r["first_token"] is not None]
+    summary = {
+        "mode": "stream" if stream else "nonstream",
+        "concurrency": concurrency,
+        "requests": len(results),
+        "errors": errors,
+        "requests_per_second": len(results) / wall,
+        "tokens": tokens,
+        "cpu_seconds": cpu,
+        "cpu_us_per_token": cpu / tokens * 1e6 if tokens else None,
+    }
+    summary.update(summarize("latency", latencies))
+    summary.update(summarize("ttft", first_tokens))
+    return summary
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+async def main(args):
+    install_stubs(args)
+    from app import app
+
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    results = []
+    for mode in modes:
+        stream = mode == "stream"
+        # Warm up client pools and the compiled graph before measuring.
+        await call_app(app, request_body(args.history, stream, -1))
+        for concurrency in levels:
+            summary = await run_level(app, args, stream, concurrency)
+            results.append(summary)
+            print(
+                f"{summary['mode']:>9} c={concurrency:<4} "
+                f"rps={summary['requests_per_second']:8.1f} "
+                f"p50={summary['latency_p50_ms']:8.1f}ms "
+                f"p99={summary['latency_p99_ms']:8.1f}ms "
+                f"ttft_p50={summary['ttft_p50_ms']:8.1f}ms "
+                f"cpu/token={summary['cpu_us_per_token'] or 0:7.1f}us "
+                f"errors={summary['errors']}"
+            )
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "settings": vars(args),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment()
+    asyncio.run(main(arguments))
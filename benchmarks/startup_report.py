@@ -0,0 +1,151 @@
+"""Cold-start report of the FastAPI app, broken down by import.
+
+Starts a fresh interpreter with ``-X importtime``, imports ``app`` and runs
+its startup warm-up for the configured model and tools, then reports the
+time of each phase and the modules and packages that account for it. The
+results are written as JSON so regressions show up across releases.
+
+    python -m benchmarks.startup_report --runs 3 --top 15
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from benchmarks.load_test import git_revision
+
+PHASE_MARKER = "--- warm-up ---"
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter() - started
+sys.stderr.write("{PHASE_MARKER}\\n")
+started = time.perf_counter()
+app.warm_up(app.AGENT_MODEL or app.DEFAULT_MODEL)
+print(json.dumps({{"import": imported, "warm_up": time.perf_counter() - started}}))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--model", help="AGENT_MODEL to start with")
+    parser.add_argument("--tools", help="AGENT_TOOLS to start with")
+    parser.add_argument("--output", default="startup_results.json")
+    return parser.parse_args()
+
+
+def probe(args) -> Dict:
+    env = dict(os.environ, LOG_LEVEL="WARNING")
+    if args.model:
+        env["AGENT_MODEL"] = args.model
+    if args.tools:
+        env["AGENT_TOOLS"] = args.tools
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    seconds = json.loads(completed.stdout.strip().splitlines()[-1])
+    phases = {"import": [], "warm_up": []}
+    phase = "import"
+    for line in completed.stderr.splitlines():
+        if line == PHASE_MARKER:
+            phase = "warm_up"
+            continue
+        match = IMPORT_LINE.match(line)
+        if match:
+            phases[phase].append(
+                {
+                    "module": match[4],
+                    "self_us": int(match[1]),
+                    "cumulative_us": int(match[2]),
+                    "depth": len(match[3]) // 2,
+                }
+            )
+    return {"seconds": seconds, "imports": phases}
+
+
+def project_modules() -> set:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return {name[:-3] for name in os.listdir(root) if name.endswith(".py")}
+
+
+def breakdown(imports: List[Dict], top: int) -> Dict:
+    """Slowest third-party imports made directly by this repo's modules, and
+    self time summed by top-level package."""
+    ours = project_modules()
+    by_package: Dict[str, int] = defaultdict(int)
+    for entry in imports:
+        by_package[entry["module"].split(".")[0]] += entry["self_us"]
+    # importtime lists a module after its children, so the nearest enclosing
+    # import of each entry is the next one with a smaller depth.
+    direct = []
+    for index, entry in enumerate(imports):
+        if entry["module"].split(".")[0] in ours:
+            continue
+        parent = next(
+            (e for e in imports[index + 1 :] if e["depth"] < entry["depth"]), None
+        )
+        if parent is None or parent["module"] in ours:
+            direct.append(entry)
+    direct.sort(key=lambda e: e["cumulative_us"], reverse=True)
+    packages = sorted(by_package.items(), key=lambda item: item[1], reverse=True)
+    return {
+        "direct_imports": [
+            {"module": e["module"], "ms": e["cumulative_us"] / 1000}
+            for e in direct[:top]
+        ],
+        "packages": [{"package": p, "ms": us / 1000} for p, us in packages[:top]],
+    }
+
+
+def main(args):
+    runs = [probe(args) for _ in range(args.runs)]
+    # The fastest run is the least disturbed by the machine.
+    best = min(runs, key=lambda run: sum(run["seconds"].values()))
+    phases = {}
+    for phase, seconds in best["seconds"].items():
+        phases[phase] = {"seconds": seconds}
+        phases[phase].update(breakdown(best["imports"][phase], args.top))
+        print(f"{phase}: {seconds * 1000:.0f}ms")
+        for entry in phases[phase]["direct_imports"]:
+            print(f"  {entry['ms']:8.1f}ms  {entry['module']}")
+        print("  by package (self time):")
+        for entry in phases[phase]["packages"]:
+            print(f"  {entry['ms']:8.1f}ms  {entry['package']}")
+    print(
+        "total: "
+        + " / ".join(f"{sum(run['seconds'].values()) * 1000:.0f}ms" for run in runs)
+    )
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "settings": vars(args),
+        },
+        "runs": [run["seconds"] for run in runs],
+        "phases": phases,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main(parse_args())
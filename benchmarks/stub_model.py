@@ -0,0 +1,123 @@
+"""Local stand-ins for the upstream chat model and tools.
+
+The stub model streams a fixed answer at a configurable token rate after a
+first-token latency and, when tools are bound, can issue tool calls on the
+first turn so the full ReAct loop is exercised.
+"""
+
+import asyncio
+import json
+import time
+from typing import List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import tool
+
+
+class TokenCounter:
+    """Content tokens produced by all stub models in this process."""
+
+    value = 0
+
+
+class StubChatModel(BaseChatModel):
+    tokens: int = 50
+    token_rate: float = 200.0
+    first_token_latency: float = 0.05
+    tool_calls: int = 0
+    bound_tools: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "stub"
+
+    def bind_tools(self, tools, **kwargs):
+        names = [getattr(t, "name", None) or t["name"] for t in tools]
+        return self.model_copy(update={"bound_tools": names})
+
+    def _should_call_tools(self, messages) -> bool:
+        return (
+            bool(self.bound_tools)
+            and self.tool_calls > 0
+            and isinstance(messages[-1], HumanMessage)
+        )
+
+    def _tool_call_message(self, messages) -> AIMessage:
+        turn = len(messages)
+        return AIMessage(
+            content="",
+            tool_calls=[
+                {
+                    "name": self.bound_tools[0],
+                    "args": {"search_phrase": f"query {turn}-{index}"},
+                    "id": f"call_{turn}_{index}",
+                    "type": "tool_call",
+                }
+                for index in range(self.tool_calls)
+            ],
+        )
+
+    def _answer_tokens(self) -> List[str]:
+        return [f"token{index} " for index in range(self.tokens)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.first_token_latency)
+        if self._should_call_tools(messages):
+            message = self._tool_call_message(messages)
+        else:
+            tokens = self._answer_tokens()
+            time.sleep(len(tokens) / self.token_rate)
+            TokenCounter.value += len(tokens)
+            message = AIMessage(content="".join(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.first_token_latency)
+        if self._should_call_tools(messages):
+            message = self._tool_call_message(messages)
+        else:
+            tokens = self._answer_tokens()
+            await asyncio.sleep(len(tokens) / self.token_rate)
+            TokenCounter.value += len(tokens)
+            message = AIMessage(content="".join(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.first_token_latency)
+        if self._should_call_tools(messages):
+            message = self._tool_call_message(messages)
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="",
+                    tool_call_chunks=[
+                        {
+                            "name": call["name"],
+                            "args": json.dumps(call["args"]),
+                            "id": call["id"],
+                            "index": index,
+                        }
+                        for index, call in enumerate(message.tool_calls)
+                    ],
+                )
+            )
+            return
+        interval = 1 / self.token_rate
+        for token in self._answer_tokens():
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            TokenCounter.value += 1
+            yield chunk
+            await asyncio.sleep(interval)
+
+
+def make_stub_tool(latency: float):
+    @tool
+    async def stub_search(search_phrase: str):
+        """Look up a search phrase in the local stub index."""
+        await asyncio.sleep(latency)
+        return f"Stub results for {search_phrase}"
+
+    return stub_search
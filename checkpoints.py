@@ -0,0 +1,141 @@
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, SystemMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+
+from config import (
+    CHECKPOINT_BACKEND,
+    CHECKPOINT_MEMORY_MAX_THREADS,
+    CHECKPOINT_SQLITE_PATH,
+)
+from models import Message
+
+logger = logging.getLogger()
+
+
+class BoundedMemorySaver(InMemorySaver):
+    """InMemorySaver that keeps the ``max_threads`` most recently used
+    threads and deletes the least recently used one beyond that."""
+
+    def __init__(self, max_threads: int = CHECKPOINT_MEMORY_MAX_THREADS):
+        super().__init__()
+        self.max_threads = max_threads
+        self._recent_lock = threading.Lock()
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+
+    def _touch(self, thread_id: str):
+        evicted = []
+        with self._recent_lock:
+            self._recent[thread_id] = None
+            self._recent.move_to_end(thread_id)
+            while len(self._recent) > self.max_threads:
+                evicted.append(self._recent.popitem(last=False)[0])
+        for thread_id in evicted:
+            self.delete_thread(thread_id)
+
+    def get_tuple(self, config):
+        # Touched even when nothing is stored, as the lookup itself adds
+        # an empty entry for the thread.
+        stored = super().get_tuple(config)
+        self._touch(config["configurable"]["thread_id"])
+        return stored
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        saved = super().put(config, checkpoint, metadata, new_versions)
+        self._touch(config["configurable"]["thread_id"])
+        return saved
+
+
+_lock = threading.Lock()
+_memory_saver: Optional[BoundedMemorySaver] = None
+_sqlite_saver = None
+_async_sqlite_saver = None
+
+
+def checkpointing_enabled() -> bool:
+    return CHECKPOINT_BACKEND in ("memory", "sqlite")
+
+
+def get_checkpointer() -> Optional[BaseCheckpointSaver]:
+    global _memory_saver, _sqlite_saver
+    if CHECKPOINT_BACKEND == "memory":
+        with _lock:
+            if _memory_saver is None:
+                _memory_saver = BoundedMemorySaver()
+        return _memory_saver
+    if CHECKPOINT_BACKEND == "sqlite":
+        from langgraph.checkpoint.sqlite import SqliteSaver
+
+        with _lock:
+            if _sqlite_saver is None:
+                conn = sqlite3.connect(CHECKPOINT_SQLITE_PATH, check_same_thread=False)
+                _sqlite_saver = SqliteSaver(conn)
+        return _sqlite_saver
+    return None
+
+
+async def aget_checkpointer() -> Optional[BaseCheckpointSaver]:
+    global _async_sqlite_saver
+    if CHECKPOINT_BACKEND != "sqlite":
+        return get_checkpointer()
+    if _async_sqlite_saver is None:
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+        conn = await aiosqlite.connect(CHECKPOINT_SQLITE_PATH)
+        if _async_sqlite_saver is None:
+            _async_sqlite_saver = AsyncSqliteSaver(conn)
+            logger.info("Using SQLite checkpoints at %s", CHECKPOINT_SQLITE_PATH)
+        else:
+            await conn.close()
+    return _async_sqlite_saver
+
+
+async def aclose_checkpointer():
+    global _async_sqlite_saver, _sqlite_saver
+    if _async_sqlite_saver is not None:
+        await _async_sqlite_saver.conn.close()
+        _async_sqlite_saver = None
+    if _sqlite_saver is not None:
+        _sqlite_saver.conn.close()
+        _sqlite_saver = None
+
+
+def thread_config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def new_turn_messages(
+    messages: List[Message], stored: Sequence[BaseMessage] = ()
+) -> List[Message]:
+    """Returns the part of the request that is not yet in the stored thread.
+
+    Clients of a checkpointed thread only need to send the new turn. Clients
+    that still resend the whole history are handled by keeping the messages
+    after the last assistant message, which the checkpoint already holds.
+    System messages already in ``stored`` are dropped too, as clients that
+    send only the new turn tend to repeat their system prompt with it.
+    """
+    turn = messages
+    for index in range(len(messages) - 1, -1, -1):
+        if messages[index].role == "assistant":
+            turn = messages[index + 1 :]
+            break
+    prompts = [m.content for m in stored if isinstance(m, SystemMessage)]
+    return [m for m in turn if m.role != "system" or m.content not in prompts]
+
+
+async def aprepare_thread(
+    checkpointer: BaseCheckpointSaver, thread_id: str, messages: List[Message]
+) -> List[Message]:
+    stored = await checkpointer.aget_tuple(thread_config(thread_id))
+    if stored is None:
+        return messages
+    return new_turn_messages(
+        messages, stored.checkpoint["channel_values"].get("messages", [])
+    )
@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from checkpoints import checkpointing_enabled
+from config import (
+    COMPLETION_CACHE_BACKEND,
+    COMPLETION_CACHE_ENABLED,
+    COMPLETION_CACHE_MAX_ENTRIES,
+    COMPLETION_CACHE_SQLITE_PATH,
+    COMPLETION_CACHE_TTL,
+)
+from models import Message
+from shared_store import SWEEP_EVERY, get_shared_store
+
+logger = logging.getLogger()
+
+
+def completion_key(
+    messages: Sequence[Message], model: Any, tool_names: Sequence[str], prompt: str
+) -> str:
+    """Canonical hash of everything that determines a completion."""
+    payload = {
+        "model": getattr(model, "value", model),
+        "tools": list(tool_names),
+        "prompt": prompt,
+        "messages": [m.model_dump(exclude_none=True) for m in messages],
+    }
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class CompletionTranscript:
+    """What a completed agent run produced, in a form both paths can replay.
+
+    ``content`` is the final answer returned by non-stream requests, ``events``
+    the ("content", text) and ("step", step_details) calls a stream made on
+    its frame encoder. Non-stream runs leave ``events`` empty. A stream
+    sets ``complete`` once it ends without an error.
+    """
+
+    def __init__(self, content: str = "", events: Optional[List] = None):
+        self.content = content
+        self.events = events if events is not None else []
+        self.complete = False
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"content": self.content, "events": self.events}, ensure_ascii=False
+        )
+
+    @classmethod
+    def from_json(cls, data: str) -> "CompletionTranscript":
+        value = json.loads(data)
+        return cls(value["content"], value["events"])
+
+    def replay_events(self) -> List[Tuple[str, Any]]:
+        """Events to re-encode for a stream, with fresh tool run ids."""
+        if not self.events:
+            return [("content", self.content)] if self.content else []
+        fresh_ids: Dict[str, str] = {}
+
+        def fresh(run_id: str) -> str:
+            if run_id not in fresh_ids:
+                fresh_ids[run_id] = str(uuid.uuid4())
+            return fresh_ids[run_id]
+
+        events = []
+        for kind, value in self.events:
+            if kind == "step":
+                value = dict(value)
+                if value.get("type") == "tool_calls":
+                    value["tool_calls"] = [
+                        {**call, "id": fresh(call["id"])}
+                        for call in value["tool_calls"]
+                    ]
+                elif value.get("type") == "tool_response":
+                    value["tool_call_id"] = fresh(value["tool_call_id"])
+            events.append((kind, value))
+        return events
+
+
+class SqliteCompletionStore:
+    """On-disk second level for the completion cache, shared across restarts."""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completions "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS completions_expires_at "
+            "ON completions (expires_at)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+        return row
+
+    def set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._writes += 1
+            if self._writes % SWEEP_EVERY == 0:
+                self._conn.execute(
+                    "DELETE FROM completions WHERE expires_at < ?", (time.time(),)
+                )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+
+
+class CompletionCache:
+    """Bounded LRU of completion transcripts with a TTL.
+
+    An optional ``store`` (anything with ``get``/``set``/``clear`` like
+    ``SqliteCompletionStore``) backs the in-memory entries; misses fall
+    through to it and its hits are promoted into memory. ``aget`` and
+    ``aput`` access the store in a worker thread, off the event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = COMPLETION_CACHE_MAX_ENTRIES,
+        ttl: float = COMPLETION_CACHE_TTL,
+        store=None,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[CompletionTranscript]:
+        entry = self._local(key)
+        if entry is None and self.store is not None:
+            entry = self._load(key)
+        return self._found(entry)
+
+    async def aget(self, key: str) -> Optional[CompletionTranscript]:
+        entry = self._local(key)
+        if entry is None and self.store is not None:
+            entry = await asyncio.to_thread(self._load, key)
+        return self._found(entry)
+
+    def _local(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.time():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        return entry
+
+    def _load(self, key: str) -> Optional[Tuple[str, float]]:
+        entry = self.store.get(key)
+        if entry is None or entry[1] <= time.time():
+            return None
+        self._remember(key, entry)
+        return entry
+
+    def _found(self, entry) -> Optional[CompletionTranscript]:
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return CompletionTranscript.from_json(entry[0])
+
+    def put(self, key: str, transcript: CompletionTranscript):
+        entry = (transcript.to_json(), time.time() + self.ttl)
+        self._remember(key, entry)
+        if self.store is not None:
+            self.store.set(key, *entry)
+
+    async def aput(self, key: str, transcript: CompletionTranscript):
+        entry = (transcript.to_json(), time.time() + self.ttl)
+        self._remember(key, entry)
+        if self.store is not None:
+            await asyncio.to_thread(self.store.set, key, *entry)
+
+    def _remember(self, key: str, entry: Tuple[str, float]):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+def _build_store():
+    if COMPLETION_CACHE_BACKEND == "sqlite":
+        return SqliteCompletionStore(COMPLETION_CACHE_SQLITE_PATH)
+    if COMPLETION_CACHE_BACKEND == "shared" and get_shared_store() is not None:
+        return get_shared_store().namespace("completion")
+    return None
+
+
+completion_cache = CompletionCache(
+    store=_build_store() if COMPLETION_CACHE_ENABLED else None
+)
+
+
+def completion_cache_enabled(thread_id: str) -> bool:
+    # Checkpointed threads carry history outside the request, so their
+    # requests are neither looked up nor stored.
+    return COMPLETION_CACHE_ENABLED and not (thread_id and checkpointing_enabled())
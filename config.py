@@ -1,3 +1,4 @@
+import json
 import os
 
 from dotenv import load_dotenv
@@ -11,3 +12,133 @@ WATSONX_URL = os.getenv("WATSONX_URL", "https://us-south.ml.cloud.ibm.com")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", None)
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY", None)
 ALPHAVANTAGE_API_KEY = os.getenv("ALPHAVANTAGE_API_KEY")
+AGENT_GRAPH_CACHE_SIZE = int(os.getenv("AGENT_GRAPH_CACHE_SIZE", "32"))
+IAM_TOKEN_REFRESH_MARGIN = float(os.getenv("IAM_TOKEN_REFRESH_MARGIN", "300"))
+IAM_REQUEST_TIMEOUT = float(os.getenv("IAM_REQUEST_TIMEOUT", "10"))
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "none").lower()
+CHECKPOINT_SQLITE_PATH = os.getenv("CHECKPOINT_SQLITE_PATH", "./checkpoints.sqlite")
+# Threads kept by the memory checkpoint backend; the least recently used
+# thread is deleted beyond this.
+CHECKPOINT_MEMORY_MAX_THREADS = int(os.getenv("CHECKPOINT_MEMORY_MAX_THREADS", "1000"))
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "true").lower() == "true"
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "1024"))
+TOOL_CACHE_MAX_BYTES = int(os.getenv("TOOL_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+# Per-tool (connect, read) timeouts in seconds; override with a JSON object.
+TOOL_TIMEOUTS = {
+    "get_currency_exchange": (3.0, 5.0),
+    "tavily_search": (3.0, 20.0),
+    "web_search_duckduckgo": (3.0, 10.0),
+    "news_search_duckduckgo": (3.0, 10.0),
+}
+TOOL_TIMEOUTS.update(
+    {k: tuple(v) for k, v in json.loads(os.getenv("TOOL_TIMEOUTS", "{}")).items()}
+)
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "8"))
+TOOL_CONCURRENCY_LIMITS = {
+    k: int(v) for k, v in json.loads(os.getenv("TOOL_CONCURRENCY_LIMITS", "{}")).items()
+}
+STREAM_COALESCE = os.getenv("STREAM_COALESCE", "false").lower() == "true"
+STREAM_COALESCE_WINDOW_MS = float(os.getenv("STREAM_COALESCE_WINDOW_MS", "30"))
+STREAM_COALESCE_MAX_CHARS = int(os.getenv("STREAM_COALESCE_MAX_CHARS", "512"))
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_QUEUE = os.getenv("LOG_QUEUE", "true").lower() == "true"
+LOG_MAX_PAYLOAD_CHARS = int(os.getenv("LOG_MAX_PAYLOAD_CHARS", "2000"))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "1.0"))
+# Model and tools used by /chat/completions; tool names come from tools.tool_choices.
+AGENT_MODEL = os.getenv("AGENT_MODEL") or None
+AGENT_TOOLS = [
+    name.strip()
+    for name in os.getenv("AGENT_TOOLS", "get_currency_exchange").split(",")
+    if name.strip()
+]
+# "record" saves model and tool calls to LLM_REPLAY_FILE, "replay" answers from it.
+LLM_REPLAY_MODE = os.getenv("LLM_REPLAY_MODE", "off").lower()
+LLM_REPLAY_FILE = os.getenv("LLM_REPLAY_FILE", "./llm_replay.jsonl")
+LLM_REPLAY_SPEED = os.getenv("LLM_REPLAY_SPEED", "realtime").lower()
+COMPLETION_CACHE_ENABLED = (
+    os.getenv("COMPLETION_CACHE_ENABLED", "false").lower() == "true"
+)
+COMPLETION_CACHE_MAX_ENTRIES = int(os.getenv("COMPLETION_CACHE_MAX_ENTRIES", "512"))
+COMPLETION_CACHE_TTL = float(os.getenv("COMPLETION_CACHE_TTL", "3600"))
+# "memory", "sqlite" or "shared"; sqlite keeps entries across restarts and
+# workers, shared keeps them in the SHARED_STORE_BACKEND store.
+COMPLETION_CACHE_BACKEND = os.getenv("COMPLETION_CACHE_BACKEND", "memory").lower()
+COMPLETION_CACHE_SQLITE_PATH = os.getenv(
+    "COMPLETION_CACHE_SQLITE_PATH", "./completion_cache.sqlite"
+)
+# Token budget for models without an entry in models.MODEL_TOKEN_BUDGETS;
+# HISTORY_TOKEN_BUDGETS is a JSON object overriding budgets per model.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "16000"))
+HISTORY_TOKEN_BUDGETS = {
+    k: int(v) for k, v in json.loads(os.getenv("HISTORY_TOKEN_BUDGETS", "{}")).items()
+}
+# Admission control for /chat/completions; a limit of 0 disables that check.
+# Per-identity limits are opt-in and never apply to unauthenticated callers,
+# who all share the "anonymous" identity.
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "64"))
+ADMISSION_MAX_CONCURRENCY_PER_IDENTITY = int(
+    os.getenv("ADMISSION_MAX_CONCURRENCY_PER_IDENTITY", "0")
+)
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "128"))
+ADMISSION_IDENTITY_QUEUE_SIZE = int(os.getenv("ADMISSION_IDENTITY_QUEUE_SIZE", "0"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+# Header selecting the priority class: "interactive" (default) or "batch".
+ADMISSION_PRIORITY_HEADER = os.getenv("ADMISSION_PRIORITY_HEADER", "X-Priority")
+# Share one agent run between identical requests that are in flight together.
+# Opt-in: identical requests from different callers then get the same answer
+# from one model run, and its tool calls are made once.
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "false").lower() == "true"
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+# Upstream requests per second started by batches, across all batches; 0 = no limit.
+BATCH_MAX_RPS = float(os.getenv("BATCH_MAX_RPS", "5"))
+BATCH_MAX_RETRIES = int(os.getenv("BATCH_MAX_RETRIES", "3"))
+# watsonx regions by URL; the JSON object in WATSONX_REGIONS adds regions or
+# overrides their space/project, e.g. {"https://eu-de.ml.cloud.ibm.com": {"space_id": "..."}}.
+WATSONX_REGIONS = {
+    WATSONX_URL: {"space_id": WATSONX_SPACE_ID, "project_id": WATSONX_PROJECT_ID}
+}
+WATSONX_REGIONS.update(json.loads(os.getenv("WATSONX_REGIONS", "{}")))
+# Latency-aware routing of requested models and model groups across targets.
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "false").lower() == "true"
+# Named groups of interchangeable models, in order of preference.
+MODEL_GROUPS = json.loads(os.getenv("MODEL_GROUPS", "{}"))
+ROUTER_FIRST_TOKEN_TIMEOUT = float(os.getenv("ROUTER_FIRST_TOKEN_TIMEOUT", "20"))
+ROUTER_CALL_TIMEOUT = float(os.getenv("ROUTER_CALL_TIMEOUT", "60"))
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))
+ROUTER_COOLDOWN_SECONDS = float(os.getenv("ROUTER_COOLDOWN_SECONDS", "30"))
+# Hedge the first model call of an agent run: if no first token arrives within
+# the hedge delay, send a duplicate call and keep whichever answers first.
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "false").lower() == "true"
+# Seconds to wait before hedging; 0 = the rolling HEDGE_PERCENTILE of observed
+# first-token latency, once HEDGE_MIN_SAMPLES calls have been seen.
+HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "0"))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Model the duplicate call goes to; empty = the same model.
+HEDGE_MODEL = os.getenv("HEDGE_MODEL", "")
+# Extra calls allowed, as a fraction of hedgeable calls.
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.1"))
+# Import the configured model's provider client, the selected tools' clients
+# and the agent graph builder during startup instead of on the first request.
+PRELOAD_ON_STARTUP = os.getenv("PRELOAD_ON_STARTUP", "true").lower() == "true"
+# State shared by the worker processes of a host (IAM token, tool results):
+# "sqlite" (one database file), "file" (a directory of files) or "none".
+SHARED_STORE_BACKEND = os.getenv("SHARED_STORE_BACKEND", "none").lower()
+SHARED_STORE_PATH = os.getenv(
+    "SHARED_STORE_PATH",
+    "./shared_state.sqlite" if SHARED_STORE_BACKEND == "sqlite" else "./shared_state",
+)
+# Reuse converted messages across requests that share a conversation prefix
+# (not used for checkpointed threads).
+MESSAGE_PREFIX_CACHE_ENABLED = (
+    os.getenv("MESSAGE_PREFIX_CACHE_ENABLED", "false").lower() == "true"
+)
+MESSAGE_PREFIX_CACHE_MAX_ENTRIES = int(
+    os.getenv("MESSAGE_PREFIX_CACHE_MAX_ENTRIES", "16384")
+)
+# JSON encoder of API responses: "pydantic" (pydantic_core writes the models
+# in one pass) or "orjson" (encodes their model_dump, used when installed).
+RESPONSE_JSON_BACKEND = os.getenv("RESPONSE_JSON_BACKEND", "pydantic").lower()
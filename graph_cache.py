@@ -0,0 +1,91 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from config import AGENT_GRAPH_CACHE_SIZE
+from replay import replay_tools
+from tool_limits import build_tool_node
+
+logger = logging.getLogger()
+
+
+class GraphCache:
+    """LRU cache of compiled ReAct agent graphs.
+
+    Keyed by model instance identity, the ordered tool names, the system
+    prompt, the checkpointer and the pre-model hook the graph is compiled
+    with. Entries hold a
+    reference to their model so the identity cannot be reused by another
+    client while the graph is cached.
+    """
+
+    def __init__(self, maxsize: int = AGENT_GRAPH_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._graphs: "OrderedDict[Tuple, Tuple[Any, Any]]" = OrderedDict()
+
+    def get(
+        self,
+        model_instance,
+        tools: Sequence,
+        prompt: str,
+        checkpointer=None,
+        pre_model_hook: Optional[Callable] = None,
+    ):
+        key = (
+            id(model_instance),
+            tuple(tool.name for tool in tools),
+            prompt,
+            id(checkpointer),
+            pre_model_hook,
+        )
+        with self._lock:
+            entry = self._graphs.get(key)
+            if entry is not None and entry[0] is model_instance:
+                self._graphs.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        logger.info("Compiling agent graph for tools %s", list(key[1]))
+        from langgraph.prebuilt import create_react_agent
+
+        graph = create_react_agent(
+            model_instance,
+            tools=build_tool_node(replay_tools(tools)) if tools else [],
+            prompt=prompt,
+            checkpointer=checkpointer,
+            pre_model_hook=pre_model_hook,
+        )
+        with self._lock:
+            self._graphs[key] = (model_instance, graph)
+            self._graphs.move_to_end(key)
+            while len(self._graphs) > self.maxsize:
+                self._graphs.popitem(last=False)
+        return graph
+
+    def clear(self):
+        with self._lock:
+            self._graphs.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._graphs)}
+
+
+graph_cache = GraphCache()
+
+
+def preload_agent_graph():
+    import langgraph.prebuilt  # noqa: F401
+
+
+def get_agent_graph(
+    model_instance,
+    tools: Sequence,
+    prompt: str,
+    checkpointer=None,
+    pre_model_hook: Optional[Callable] = None,
+):
+    return graph_cache.get(model_instance, tools, prompt, checkpointer, pre_model_hook)
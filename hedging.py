@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableBinding
+
+from config import (
+    HEDGE_BUDGET,
+    HEDGE_DELAY,
+    HEDGE_ENABLED,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_MODEL,
+    HEDGE_PERCENTILE,
+)
+from llm_clients import set_model_hedger
+from metrics import HEDGE_DECISIONS, HEDGE_WINS
+
+logger = logging.getLogger()
+
+# Latency samples kept per model and call kind for the rolling percentile.
+WINDOW = 200
+# Unused hedge budget carries over up to this many extra calls.
+MAX_CREDIT = 10.0
+
+
+def is_first_call(messages) -> bool:
+    # Later calls of an agent run answer tool results, so the conversation
+    # only ends with the user's message on the first one.
+    return bool(messages) and isinstance(messages[-1], HumanMessage)
+
+
+def _unwrap(bound) -> Tuple[BaseChatModel, Dict[str, Any]]:
+    if isinstance(bound, RunnableBinding):
+        return bound.bound, bound.kwargs
+    return bound, {}
+
+
+class ModelHedger:
+    """Decides when to hedge and keeps the extra calls within budget.
+
+    Each hedgeable call earns ``budget`` credit and each hedge spends one,
+    so over time at most ``budget`` of first calls are duplicated.
+    """
+
+    def __init__(
+        self,
+        delay: float = HEDGE_DELAY,
+        percentile: float = HEDGE_PERCENTILE,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        budget: float = HEDGE_BUDGET,
+        alternate: str = HEDGE_MODEL,
+    ):
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget = budget
+        self.alternate = alternate
+        self._lock = threading.Lock()
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._credit = 1.0
+        self._wrapped: Dict[Tuple[int, int], "HedgedChatModel"] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def alternate_for(self, model: str) -> str:
+        return self.alternate or model
+
+    def wrap(
+        self, model: str, primary: BaseChatModel, alternate: BaseChatModel
+    ) -> "HedgedChatModel":
+        key = (id(primary), id(alternate))
+        with self._lock:
+            hedged = self._wrapped.get(key)
+            if (
+                hedged is None
+                or hedged.primary is not primary
+                or hedged.alternate is not alternate
+            ):
+                hedged = HedgedChatModel(
+                    label=str(getattr(model, "value", model)),
+                    primary=primary,
+                    alternate=alternate,
+                )
+                self._wrapped[key] = hedged
+            return hedged
+
+    def hedge_delay(self, label: str, kind: str) -> Optional[float]:
+        """Seconds to wait before hedging, None while there is no estimate."""
+        with self._lock:
+            self._credit = min(self._credit + self.budget, MAX_CREDIT)
+            if self.delay:
+                return self.delay
+            samples = self._samples.get((label, kind))
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            ordered = sorted(samples)
+        return ordered[min(int(len(ordered) * self.percentile), len(ordered) - 1)]
+
+    def observe(self, label: str, kind: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get((label, kind))
+            if samples is None:
+                samples = self._samples[(label, kind)] = deque(maxlen=WINDOW)
+            samples.append(seconds)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self._credit < 1:
+                return False
+            self._credit -= 1
+            return True
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(thread_name_prefix="hedge")
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class HedgedChatModel(BaseChatModel):
+    """Sends a duplicate of a slow first call and keeps the faster answer.
+
+    Only the first model call of an agent run is hedged; tool-result turns
+    go straight to ``primary``. The hedge goes to ``alternate``, which may
+    be the same model. Once one call produces its first chunk (or its
+    result, for non-stream calls) the other is cancelled. A sync loser runs
+    to completion in its worker thread and is discarded.
+    """
+
+    label: str
+    primary: BaseChatModel
+    alternate: BaseChatModel
+    primary_kwargs: Dict[str, Any] = {}
+    alternate_kwargs: Dict[str, Any] = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged-" + self.primary._llm_type
+
+    def bind_tools(self, tools, **kwargs):
+        primary, primary_kwargs = _unwrap(self.primary.bind_tools(tools, **kwargs))
+        alternate, alternate_kwargs = primary, primary_kwargs
+        if self.alternate is not self.primary:
+            alternate, alternate_kwargs = _unwrap(
+                self.alternate.bind_tools(tools, **kwargs)
+            )
+        return self.model_copy(
+            update={
+                "primary": primary,
+                "alternate": alternate,
+                "primary_kwargs": primary_kwargs,
+                "alternate_kwargs": alternate_kwargs,
+            }
+        )
+
+    def _calls(self, kind: str, messages, stop, run_manager, kwargs) -> List[Callable]:
+        def call(model: BaseChatModel, bound_kwargs: Dict[str, Any]):
+            method = getattr(model, kind)
+            return lambda: method(
+                messages, stop=stop, run_manager=run_manager, **bound_kwargs, **kwargs
+            )
+
+        return [
+            call(self.primary, self.primary_kwargs),
+            call(self.alternate, self.alternate_kwargs),
+        ]
+
+    def _decide(self, delay: Optional[float], finished: bool) -> bool:
+        if finished:
+            HEDGE_DECISIONS.labels(self.label, "not_needed").inc()
+            return False
+        if not model_hedger.spend():
+            HEDGE_DECISIONS.labels(self.label, "over_budget").inc()
+            return False
+        logger.info("No first token from %s after %.2fs, hedging", self.label, delay)
+        HEDGE_DECISIONS.labels(self.label, "hedged").inc()
+        return True
+
+    def _winner(self, index: int, hedged: bool, kind: str, started: float):
+        # When the hedge wins, the primary took at least this long, so the
+        # sample still keeps the percentile honest.
+        model_hedger.observe(self.label, kind, time.monotonic() - started)
+        if hedged:
+            HEDGE_WINS.labels(self.label, ("primary", "hedge")[index]).inc()
+
+    async def _race(
+        self, starts: List[Callable[[], Awaitable]], kind: str
+    ) -> Tuple[int, Any]:
+        """Awaits starts[0](), hedged with starts[1]() after the hedge delay.
+
+        Returns (index, result) of the first attempt to finish; a failed
+        attempt only fails the race if the other one is not running.
+        """
+        started = time.monotonic()
+        delay = model_hedger.hedge_delay(self.label, kind)
+        tasks = {asyncio.ensure_future(starts[0]()): 0}
+        hedged = False
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                hedged = self._decide(delay, bool(done))
+                if hedged:
+                    tasks[asyncio.ensure_future(starts[1]())] = 1
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    index = tasks.pop(task)
+                    error = task.exception()
+                    if tasks and not isinstance(
+                        error, (type(None), StopAsyncIteration)
+                    ):
+                        logger.warning(
+                            "Hedged call to %s failed: %s", self.label, error
+                        )
+                        continue
+                    self._winner(index, hedged, kind, started)
+                    return index, task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        calls = self._calls("_generate", messages, stop, run_manager, kwargs)
+        if not is_first_call(messages):
+            return calls[0]()
+        started = time.monotonic()
+        delay = model_hedger.hedge_delay(self.label, "generate")
+        if delay is None:
+            result = calls[0]()
+            self._winner(0, False, "generate", started)
+            return result
+        futures = {model_hedger.executor.submit(calls[0]): 0}
+        done, _ = wait_futures(futures, timeout=delay)
+        hedged = self._decide(delay, bool(done))
+        if hedged:
+            futures[model_hedger.executor.submit(calls[1])] = 1
+        while True:
+            done, _ = wait_futures(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures.pop(future)
+                if future.exception() is not None and futures:
+                    logger.warning(
+                        "Hedged call to %s failed: %s", self.label, future.exception()
+                    )
+                    continue
+                self._winner(index, hedged, "generate", started)
+                return future.result()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        calls = self._calls("_agenerate", messages, stop, run_manager, kwargs)
+        if not is_first_call(messages):
+            return await calls[0]()
+        _, result = await self._race(calls, "generate")
+        return result
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        calls = self._calls("_astream", messages, stop, run_manager, kwargs)
+        if not is_first_call(messages):
+            async for chunk in calls[0]():
+                yield chunk
+            return
+        streams = []
+
+        def start(call: Callable) -> Callable[[], Awaitable]:
+            def first_chunk():
+                stream = call()
+                streams.append(stream)
+                return stream.__anext__()
+
+            return first_chunk
+
+        try:
+            try:
+                index, first = await self._race([start(c) for c in calls], "stream")
+            except StopAsyncIteration:
+                return
+            winner = streams[index]
+            yield first
+            async for chunk in winner:
+                yield chunk
+        finally:
+            for stream in streams:
+                await stream.aclose()
+
+
+model_hedger = ModelHedger()
+if HEDGE_ENABLED:
+    set_model_hedger(model_hedger)
@@ -0,0 +1,67 @@
+import threading
+from typing import Dict, Tuple
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import HTTP_POOL_SIZE, TOOL_TIMEOUTS
+
+DEFAULT_TIMEOUT = (3.0, 10.0)
+
+# Pools are named so clients that configure their session (e.g. Tavily
+# setting its API key as a default header) do not leak that into others.
+SHARED_POOL = "shared"
+
+_lock = threading.Lock()
+_sessions: Dict[str, requests.Session] = {}
+_async_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def tool_timeout(tool_name: str) -> Tuple[float, float]:
+    return TOOL_TIMEOUTS.get(tool_name, DEFAULT_TIMEOUT)
+
+
+def tool_httpx_timeout(tool_name: str) -> httpx.Timeout:
+    connect, read = tool_timeout(tool_name)
+    return httpx.Timeout(read, connect=connect)
+
+
+def get_session(pool: str = SHARED_POOL) -> requests.Session:
+    """Keep-alive session of the named pool for synchronous tool calls."""
+    session = _sessions.get(pool)
+    if session is None:
+        with _lock:
+            session = _sessions.get(pool)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _sessions[pool] = session
+    return session
+
+
+def get_async_client(pool: str = SHARED_POOL) -> httpx.AsyncClient:
+    """Keep-alive client of the named pool for asynchronous tool calls."""
+    client = _async_clients.get(pool)
+    if client is None or client.is_closed:
+        client = _async_clients[pool] = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_SIZE,
+                max_keepalive_connections=HTTP_POOL_SIZE,
+            ),
+            timeout=httpx.Timeout(DEFAULT_TIMEOUT[1], connect=DEFAULT_TIMEOUT[0]),
+        )
+    return client
+
+
+async def aclose_clients():
+    for client in list(_async_clients.values()):
+        await client.aclose()
+    _async_clients.clear()
+    for session in list(_sessions.values()):
+        session.close()
+    _sessions.clear()
@@ -0,0 +1,244 @@
+import importlib
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from config import OPENAI_API_KEY, WATSONX_API_KEY, WATSONX_REGIONS, WATSONX_URL
+from replay import (
+    RecordingChatModel,
+    ReplayChatModel,
+    recording_enabled,
+    replay_enabled,
+)
+from token_utils import aget_access_token, get_access_token
+
+logger = logging.getLogger()
+
+OPENAI_DEFAULTS = {"temperature": 0, "streaming": False}
+
+# Extra providers selected by a "<prefix>/" model name, e.g. local stubs.
+_custom_providers: Dict[str, Callable[[str, Dict[str, Any]], Any]] = {}
+
+
+def register_provider(prefix: str, factory: Callable[[str, Dict[str, Any]], Any]):
+    """Builds models named ``<prefix>/...`` with ``factory(model, overrides)``."""
+    _custom_providers[prefix] = factory
+
+
+def get_provider(model: str) -> str:
+    prefix = model.split("/", 1)[0]
+    if prefix in _custom_providers:
+        return prefix
+    if "gpt" in model:
+        return "openai"
+    return "watsonx"
+
+
+# Client libraries are imported on first use; a deployment usually needs only
+# one provider and they make up most of the import time.
+PROVIDER_MODULES = {
+    "openai": ("langchain_openai",),
+    "watsonx": ("ibm_watsonx_ai", "langchain_ibm"),
+}
+
+
+def preload_provider(model: str):
+    """Imports the client libraries of ``model``'s provider ahead of use."""
+    for module in PROVIDER_MODULES.get(get_provider(model), ()):
+        importlib.import_module(module)
+
+
+def _freeze(overrides: Dict[str, Any]) -> Tuple:
+    return tuple(sorted((k, repr(v)) for k, v in overrides.items()))
+
+
+class ModelClientRegistry:
+    """Process-wide pool of chat model clients.
+
+    Clients are keyed by (provider, model, parameter overrides, region) and
+    built once; concurrent requests share the same instance and its HTTP
+    connection pool. Regions are watsonx URLs from WATSONX_REGIONS, each with
+    one shared APIClient. A rotated watsonx token is pushed into the shared
+    APIClients, a changed OpenAI key evicts and rebuilds the affected clients.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._models: Dict[Tuple, Tuple[Optional[str], Any]] = {}
+        self._watsonx_clients: Dict[str, Any] = {}
+        self._watsonx_token: Optional[str] = None
+
+    def get(
+        self,
+        model: str,
+        parm_overrides: Optional[dict] = None,
+        region: Optional[str] = None,
+    ):
+        provider = get_provider(model)
+        overrides = dict(parm_overrides or {})
+        if provider == "watsonx":
+            region = region or WATSONX_URL
+        key = (provider, model, _freeze(overrides), region)
+        if replay_enabled():
+            return self._get_replay(key, model)
+        credential = self._credential(provider)
+        entry = self._models.get(key)
+        if entry is not None and entry[0] == credential:
+            return entry[1]
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None and entry[0] == credential:
+                return entry[1]
+            if entry is not None:
+                logger.info("Credentials rotated, rebuilding %s client", provider)
+            logger.info("Creating %s client for model %s", provider, model)
+            if provider in _custom_providers:
+                instance = _custom_providers[provider](model, overrides)
+            elif provider == "openai":
+                instance = self._build_openai(model, overrides)
+            else:
+                instance = self._build_watsonx(model, overrides, region)
+            if recording_enabled():
+                instance = RecordingChatModel(inner=instance, model_name=model)
+            self._models[key] = (credential, instance)
+            return instance
+
+    async def aget(
+        self,
+        model: str,
+        parm_overrides: Optional[dict] = None,
+        region: Optional[str] = None,
+    ):
+        if get_provider(model) == "watsonx" and not replay_enabled():
+            # Make sure a valid token is in memory so get() never blocks on IAM.
+            await aget_access_token(WATSONX_API_KEY)
+        return self.get(model, parm_overrides, region)
+
+    def _get_replay(self, key: Tuple, model: str):
+        # Replayed models never need credentials or an upstream client.
+        entry = self._models.get(key)
+        if entry is None:
+            with self._lock:
+                entry = self._models.setdefault(
+                    key, (None, ReplayChatModel(model_name=model))
+                )
+        return entry[1]
+
+    def evict(self, provider: Optional[str] = None):
+        with self._lock:
+            for key in list(self._models):
+                if provider is None or key[0] == provider:
+                    del self._models[key]
+            if provider in (None, "watsonx"):
+                self._watsonx_clients.clear()
+                self._watsonx_token = None
+
+    def _credential(self, provider: str) -> Optional[str]:
+        if provider == "openai":
+            return os.getenv("OPENAI_API_KEY") or OPENAI_API_KEY
+        if provider != "watsonx":
+            return None
+        token = get_access_token(WATSONX_API_KEY)
+        if self._watsonx_clients and token != self._watsonx_token:
+            with self._lock:
+                if token != self._watsonx_token:
+                    for client in self._watsonx_clients.values():
+                        client.set_token(token)
+                    self._watsonx_token = token
+        # The shared APIClient absorbs token rotation, so watsonx models do not
+        # need to be rebuilt when the token changes.
+        return None
+
+    def _build_openai(self, model: str, overrides: Dict[str, Any]):
+        from langchain_openai import ChatOpenAI
+
+        params = dict(OPENAI_DEFAULTS)
+        params.update(overrides)
+        return ChatOpenAI(model=model, **params)
+
+    def _build_watsonx(self, model: str, overrides: Dict[str, Any], region: str):
+        from ibm_watsonx_ai import APIClient, Credentials
+        from langchain_ibm import ChatWatsonx
+
+        client = self._watsonx_clients.get(region)
+        if client is None:
+            settings = WATSONX_REGIONS.get(region, {})
+            token = get_access_token(WATSONX_API_KEY)
+            credentials = Credentials(url=region, token=token)
+            if settings.get("space_id"):
+                client = APIClient(
+                    credentials=credentials, space_id=settings["space_id"]
+                )
+            elif settings.get("project_id"):
+                client = APIClient(
+                    credentials=credentials, project_id=settings["project_id"]
+                )
+            else:
+                # Raised before caching, so token rotation never sees a None client.
+                raise ValueError(
+                    "You must either set WATSONX_SPACE_ID or WATSONX_PROJECT_ID "
+                    f"(watsonx region {region})"
+                )
+            self._watsonx_clients[region] = client
+            self._watsonx_token = token
+        return ChatWatsonx(model_id=model, watsonx_client=client, **overrides)
+
+
+model_clients = ModelClientRegistry()
+
+# Set by router.py and hedging.py when enabled. Routed names resolve to a
+# model that picks a target per call; hedging wraps the resolved model.
+_model_router = None
+_model_hedger = None
+
+
+def set_model_router(router):
+    global _model_router
+    _model_router = router
+
+
+def set_model_hedger(hedger):
+    global _model_hedger
+    _model_hedger = hedger
+
+
+def _routed(model: str, parm_overrides: Optional[dict]):
+    if _model_router is None or not _model_router.routes(model):
+        return None
+    return _model_router.get(model, parm_overrides)
+
+
+def _resolve(model: str, parm_overrides: Optional[dict]):
+    return _routed(model, parm_overrides) or model_clients.get(model, parm_overrides)
+
+
+async def _aresolve(model: str, parm_overrides: Optional[dict]):
+    routed = _routed(model, parm_overrides)
+    if routed is not None:
+        return routed
+    return await model_clients.aget(model, parm_overrides)
+
+
+def get_chat_model(model: str, parm_overrides: Optional[dict] = None):
+    instance = _resolve(model, parm_overrides)
+    if _model_hedger is None:
+        return instance
+    alternate = _model_hedger.alternate_for(model)
+    if alternate != model:
+        alternate = _resolve(alternate, parm_overrides)
+    else:
+        alternate = instance
+    return _model_hedger.wrap(model, instance, alternate)
+
+
+async def aget_chat_model(model: str, parm_overrides: Optional[dict] = None):
+    instance = await _aresolve(model, parm_overrides)
+    if _model_hedger is None:
+        return instance
+    alternate = _model_hedger.alternate_for(model)
+    if alternate != model:
+        alternate = await _aresolve(alternate, parm_overrides)
+    else:
+        alternate = instance
+    return _model_hedger.wrap(model, instance, alternate)
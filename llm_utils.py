@@ -1,29 +1,48 @@
+import asyncio
+import functools
 import json
 import logging
 import time
 import traceback
-import uuid
-from typing import Any, Dict, List, Optional
-
-from ibm_watsonx_ai import APIClient, Credentials
-from langchain_core.messages import (
-    AIMessage,
-    BaseMessage,
-    HumanMessage,
-    SystemMessage,
-    ToolCall,
-    ToolMessage,
-)
-from langchain_ibm import ChatWatsonx
-from langchain_openai import ChatOpenAI
-from langgraph.prebuilt import create_react_agent
+import warnings
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
 
+from checkpoints import (
+    aget_checkpointer,
+    aprepare_thread,
+    checkpointing_enabled,
+    thread_config,
+)
+from completion_cache import (
+    CompletionTranscript,
+    completion_cache,
+    completion_cache_enabled,
+    completion_key,
+)
 from config import (
     OPENAI_API_KEY,
-    WATSONX_API_KEY,
-    WATSONX_PROJECT_ID,
-    WATSONX_SPACE_ID,
-    WATSONX_URL,
+    STREAM_COALESCE,
+    STREAM_COALESCE_MAX_CHARS,
+    STREAM_COALESCE_WINDOW_MS,
+    STREAM_HEARTBEAT_SECONDS,
+)
+from graph_cache import get_agent_graph
+from llm_clients import aget_chat_model
+from log_utils import Truncated, sample_payload
+from message_conversion import convert_messages
+from metrics import (
+    HISTORY_TRIMMED_TOKENS,
+    LLM_CALL_SECONDS,
+    MESSAGE_CONVERSION_SECONDS,
+    MODEL_SETUP_SECONDS,
+    STREAMED_TOKENS,
+    TIME_TO_FIRST_TOKEN_SECONDS,
+    TOOL_CALL_SECONDS,
+    AgentMetricsCallback,
+    RunTimer,
+    model_label,
 )
 from models import (
     AIToolCall,
@@ -33,66 +52,64 @@ from models import (
     Message,
     MessageResponse,
 )
-from token_utils import get_access_token
+from replay import replay_enabled
+from singleflight import single_flight, single_flight_enabled
+from sse import CoalescingFrameEncoder, StreamFrameEncoder, pace_frames
+from token_budget import tokenizer, trim_history
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
+API_KEY_MISSING = "API key not set\n"
 STATE_MODIFIER = "When thinking or passing parameters to tools, always use English. But, when you are giving out the final answer, use Korean."
 
 
-def init_openai(model: str, parm_overrides: dict = {}):
-    defaults = {"temperature": 0, "streaming": False}
-    defaults.update(parm_overrides)
-    return ChatOpenAI(model=model, **defaults)
-
-
-def convert_messages_to_langgraph_format(messages: List[Message]) -> Dict[str, Any]:
-    conv_messages = []
-    max_message_length = 50000
-    for msg in messages:
-        if msg.content and len(msg.content) > max_message_length:
-            msg.content = msg.content[:max_message_length]
-        role = msg.role
-        logger.debug(f"Converting input message of type {role}")
-        if role.lower() == "user" or role.lower() == "human":
-            new_message = HumanMessage(content=msg.content)
-        if role.lower() == "system":
-            new_message = SystemMessage(content=msg.content)
-        if role.lower() == "assistant":
-            content = ""
-            additional_kwargs = {}
-            if msg.content:
-                content = msg.content
-            if msg.tool_calls:
-                # Convert list of AIToolCall messages to langchain ToolCall message
-                langchain_tool_calls = []
-                for index, tool_call in enumerate(msg.tool_calls):
-                    name = tool_call.function.name
-                    args = tool_call.function.arguments
-                    id = tool_call.id
-                    langchain_tool_calls.append(
-                        ToolCall(name=name, args=args, id=id, type="tool")
-                    )
+def convert_messages_to_langgraph_format(
+    messages: List[Message], use_cache: bool = False
+) -> Dict[str, Any]:
+    return {"messages": convert_messages(messages, use_cache)}
 
-                new_message = AIMessage(
-                    content=content,
-                    tool_calls=langchain_tool_calls,
-                    additional_kwargs=additional_kwargs,
-                )
-            else:
-                new_message = AIMessage(
-                    content=content, additional_kwargs=additional_kwargs
-                )
-        if role.lower() == "tool":
-            tool_call_id = msg.tool_call_id
-            content = msg.content
-            name = None
-            new_message = ToolMessage(
-                content=content, name=name, tool_call_id=tool_call_id
-            )
-        conv_messages.append(new_message)
-    return {"messages": conv_messages}
+
+def _trim_to_budget(messages: List[BaseMessage], model: str) -> List[BaseMessage]:
+    trimmed, dropped = trim_history(messages, model, STATE_MODIFIER)
+    if dropped:
+        logger.info("Trimmed %d history tokens for model %s", dropped, model)
+        HISTORY_TRIMMED_TOKENS.labels(model_label(model)).inc(dropped)
+    return trimmed
+
+
+def build_agent_inputs(
+    messages: List[Message], model: str, use_cache: bool = False
+) -> Dict[str, Any]:
+    """Converts request messages and trims them to the model's token budget.
+
+    ``use_cache`` allows converted messages to be shared with other requests
+    through the prefix cache; it must be False for checkpointed threads.
+    """
+    inputs = convert_messages_to_langgraph_format(messages, use_cache)
+    inputs["messages"] = _trim_to_budget(inputs["messages"], model)
+    return inputs
+
+
+@functools.lru_cache(maxsize=None)
+def history_budget_hook(model: str) -> Callable:
+    """Pre-model hook that trims the whole thread to the model's budget.
+
+    A checkpointed thread's request only carries the new turn, so the stored
+    history has to be trimmed before every model call. The trimmed list is
+    only sent to the model; the checkpoint keeps the full history. One hook
+    per model, so cached agent graphs can be reused.
+    """
+
+    def trim_thread(state: Dict[str, Any]) -> Dict[str, Any]:
+        return {"llm_input_messages": _trim_to_budget(state["messages"], model)}
+
+    return trim_thread
+
+
+def _agent_graph(model_instance, tools, model: str, checkpointer):
+    hook = history_budget_hook(model) if checkpointer is not None else None
+    return get_agent_graph(model_instance, tools, STATE_MODIFIER, checkpointer, hook)
 
 
 def convert_response_to_messages(response: dict) -> List[Message]:
@@ -101,7 +118,7 @@ def convert_response_to_messages(response: dict) -> List[Message]:
         role = "not found"
         if msg.type:
             role = msg.type
-        logger.info(f"Processing role {role}")
+        logger.debug("Processing role %s", role)
         tool_calls = None
         if "tool_calls" in msg:
             tool_calls = msg["tool_calls"]
@@ -148,173 +165,260 @@ def convert_response_to_messages(response: dict) -> List[Message]:
     return messages
 
 
+def _api_key_missing(model: str) -> bool:
+    return "gpt" in model and not OPENAI_API_KEY and not replay_enabled()
+
+
+async def get_llm_async(messages: List[Message], model: str, thread_id: str, tools):
+    log_payloads = sample_payload()
+    logger.info(
+        "LLM Asynchronous call using model %s and tools %s", model, _tool_names(tools)
+    )
+    # Checked before the completion cache so the error is never cached.
+    if _api_key_missing(model):
+        return API_KEY_MISSING, messages
+    use_cache = completion_cache_enabled(thread_id)
+    if not (use_cache or single_flight_enabled(thread_id)):
+        return await _run_agent_async(messages, model, thread_id, tools, log_payloads)
+    cache_key = completion_key(messages, model, _tool_names(tools), STATE_MODIFIER)
+    if use_cache:
+        cached = await completion_cache.aget(cache_key)
+        if cached is not None:
+            logger.info("Completion cache hit for model %s", model)
+            return cached.content, messages
+    if single_flight_enabled(thread_id):
+        results, messages = await single_flight.call(
+            cache_key,
+            lambda: _run_agent_async(messages, model, thread_id, tools, log_payloads),
+        )
+    else:
+        results, messages = await _run_agent_async(
+            messages, model, thread_id, tools, log_payloads
+        )
+    if use_cache and isinstance(results, str):
+        await completion_cache.aput(cache_key, CompletionTranscript(results))
+    return results, messages
+
+
 def get_llm_sync(messages: List[Message], model: str, thread_id: str, tools):
-    logger.info(f"LLM Synchronous call using model {model} and tools {tools}")
-    model_instance = None
+    """Deprecated blocking wrapper around ``get_llm_async``, kept for
+    external callers; it must not be called from a running event loop."""
+    warnings.warn(
+        "get_llm_sync is deprecated, use get_llm_async",
+        DeprecationWarning,
+        stacklevel=2,
+    )
+    return asyncio.run(get_llm_async(messages, model, thread_id, tools))
+
+
+async def _run_agent_async(
+    messages: List[Message], model: str, thread_id: str, tools, log_payloads: bool
+):
+    label = model_label(model)
+    setup_started = time.perf_counter()
     if "gpt" in model:
-        if not OPENAI_API_KEY:
-            return "API key not set\n"
-        model_instance = init_openai(model, {})
+        model_instance = await aget_chat_model(model, {})
     else:
-        client_model_instance = None
-        if WATSONX_SPACE_ID:
-            client_model_instance = APIClient(
-                credentials=Credentials(
-                    url=WATSONX_URL, token=get_access_token(WATSONX_API_KEY)
-                ),
-                space_id=WATSONX_SPACE_ID,
-            )
-        elif WATSONX_PROJECT_ID:
-            client_model_instance = APIClient(
-                credentials=Credentials(
-                    url=WATSONX_URL, token=get_access_token(WATSONX_API_KEY)
-                ),
-                project_id=WATSONX_PROJECT_ID,
-            )
-        else:
-            logger.error("You must either set WATSONX_SPACE_ID or WATSONX_PROJECT_ID")
-        model_instance = ChatWatsonx(
-            model_id=model, watsonx_client=client_model_instance
-        )
-    logger.info(f"Starting with input messages: {messages}")
-    inputs = convert_messages_to_langgraph_format(messages)
-    validate_chat_history(inputs["messages"])
-    logger.info(f"Calling langgraph with input: {inputs}")
-    if tools:
-        graph = create_react_agent(model_instance, tools=tools, prompt=STATE_MODIFIER)
-        response = graph.invoke(inputs)
+        model_instance = await aget_chat_model(model)
+    checkpointer = None
+    config = {"callbacks": [AgentMetricsCallback(model)]}
+    if thread_id and checkpointing_enabled():
+        checkpointer = await aget_checkpointer()
+        messages = await aprepare_thread(checkpointer, thread_id, messages)
+        config.update(thread_config(thread_id))
+    graph = None
+    if tools or checkpointer:
+        graph = _agent_graph(model_instance, tools, model, checkpointer)
+    MODEL_SETUP_SECONDS.labels(label).observe(time.perf_counter() - setup_started)
+    if log_payloads:
+        logger.info("Starting with input messages: %s", Truncated(messages))
+    conversion_started = time.perf_counter()
+    inputs = build_agent_inputs(messages, model, use_cache=checkpointer is None)
+    MESSAGE_CONVERSION_SECONDS.labels(label).observe(
+        time.perf_counter() - conversion_started
+    )
+    if log_payloads:
+        logger.debug("Calling langgraph with input: %s", Truncated(inputs))
+    if graph is not None:
+        response = await graph.ainvoke(inputs, config=config)
     else:
-        graph = model_instance
-        response = graph.invoke(inputs["messages"])
-    logger.info(f"Response: {response}")
+        response = await model_instance.ainvoke(inputs["messages"], config=config)
+    if log_payloads:
+        logger.info("Response: %s", Truncated(response))
     if hasattr(response, "content"):
         results = response.content
-        message = Message(role="ai", content=results)
-        response_messages = [message.dict()]
     else:
         results = response["messages"][-1].content
     return results, messages
 
 
+def _tool_names(tools) -> List[str]:
+    return [tool.name for tool in tools or []]
+
+
 def format_resp(struct):
     return "data: " + json.dumps(struct, ensure_ascii=False) + "\n\n"
 
 
-def validate_chat_history(messages: List[BaseMessage]):
-    tool_call_ids = set()
-    for msg in messages:
-        if isinstance(msg, AIMessage) and msg.tool_calls:
-            for tool_call in msg.tool_calls:
-                if isinstance(tool_call, dict):
-                    tool_call_ids.add(tool_call.get("id"))
-                else:
-                    tool_call_ids.add(tool_call.id)
-
-    for msg in messages:
-        if isinstance(msg, ToolMessage):
-            if msg.tool_call_id in tool_call_ids:
-                tool_call_ids.remove(msg.tool_call_id)
-
-    for tool_call_id in tool_call_ids:
-        logger.info(
-            f"Fixing input that had no tool response for tool_call_id {tool_call_id}"
-        )
-        placeholder_message = ToolMessage(
-            content="Tool call failed or no response received.",
-            tool_call_id=tool_call_id,
-            name="unknown",
+async def get_llm_stream(messages: List[Message], model: str, thread_id: str, tools):
+    if not STREAM_COALESCE:
+        encoder = StreamFrameEncoder(thread_id or "", model)
+        async for frame in _stream_frames(messages, model, thread_id, tools, encoder):
+            yield frame
+        return
+    encoder = CoalescingFrameEncoder(
+        thread_id or "",
+        model,
+        window=STREAM_COALESCE_WINDOW_MS / 1000,
+        max_chars=STREAM_COALESCE_MAX_CHARS,
+    )
+    frames = _stream_frames(messages, model, thread_id, tools, encoder)
+    async for batch in pace_frames(frames, encoder, STREAM_HEARTBEAT_SECONDS):
+        yield batch
+
+
+async def _stream_frames(
+    messages: List[Message],
+    model: str,
+    thread_id: str,
+    tools,
+    encoder: StreamFrameEncoder,
+):
+    """Frames of an agent run, replayed from the completion cache on a hit and
+    shared with identical concurrent requests when single-flight applies."""
+    use_cache = completion_cache_enabled(thread_id)
+    use_flight = single_flight_enabled(thread_id)
+    if not (use_cache or use_flight):
+        async for frame in _stream_agent_frames(
+            messages, model, thread_id, tools, encoder
+        ):
+            yield frame
+        return
+    cache_key = completion_key(messages, model, _tool_names(tools), STATE_MODIFIER)
+    transcript = None
+    if use_cache:
+        cached = await completion_cache.aget(cache_key)
+        if cached is not None:
+            logger.info("Completion cache hit for model %s", model)
+            for kind, value in cached.replay_events():
+                yield _encode_event(encoder, kind, value)
+            return
+        transcript = CompletionTranscript()
+
+    def run(run_encoder):
+        return _stream_agent_frames(
+            messages, model, thread_id, tools, run_encoder, transcript
         )
-        messages.append(placeholder_message)
 
+    if use_flight:
+        async for kind, value in single_flight.stream(cache_key, run):
+            yield _encode_event(encoder, kind, value)
+    else:
+        async for frame in run(encoder):
+            yield frame
+    if transcript is not None and transcript.complete:
+        await completion_cache.aput(cache_key, transcript)
 
-async def get_llm_stream(messages: List[Message], model: str, thread_id: str, tools):
+
+def _encode_event(encoder: StreamFrameEncoder, kind: str, value: Any) -> str:
+    if kind == "content":
+        return encoder.content(value)
+    if kind == "step":
+        return encoder.step(value)
+    return value
+
+
+async def _stream_agent_frames(
+    messages: List[Message],
+    model: str,
+    thread_id: str,
+    tools,
+    encoder: StreamFrameEncoder,
+    transcript: Optional[CompletionTranscript] = None,
+):
     if tools:
         use_tools = True
     else:
         use_tools = False
     send_tool_events = True
-    logger.info(f"LLM Stream with tools {tools}")
+    log_payloads = sample_payload()
+    logger.info("LLM Stream with tools %s", _tool_names(tools))
     model_init_overrides = {"temperature": 0, "streaming": True}
+    label = model_label(model)
+    stream_started = time.perf_counter()
+    first_token_seen = False
+    run_timer = RunTimer()
     if not thread_id:
         logger.warn("Warning no thread_id specified in input")
         thread_id = ""
     if "gpt" in model:
-        if not OPENAI_API_KEY:
+        if not OPENAI_API_KEY and not replay_enabled():
             yield "API key not set\n"
-        model_instance = init_openai(model, model_init_overrides)
+        model_instance = await aget_chat_model(model, model_init_overrides)
     else:
-        client_model_instance = None
-        if WATSONX_SPACE_ID:
-            client_model_instance = APIClient(
-                credentials=Credentials(
-                    url=WATSONX_URL, token=get_access_token(WATSONX_API_KEY)
-                ),
-                space_id=WATSONX_SPACE_ID,
-            )
-        elif WATSONX_PROJECT_ID:
-            client_model_instance = APIClient(
-                credentials=Credentials(
-                    url=WATSONX_URL, token=get_access_token(WATSONX_API_KEY)
-                ),
-                project_id=WATSONX_PROJECT_ID,
-            )
-        else:
-            logger.error("You must either set WATSONX_SPACE_ID or WATSONX_PROJECT_ID")
-        model_instance = ChatWatsonx(
-            model_id=model, watsonx_client=client_model_instance
-        )
+        model_instance = await aget_chat_model(model)
+    checkpointer = None
+    config = None
+    if thread_id and checkpointing_enabled():
+        checkpointer = await aget_checkpointer()
+        config = thread_config(thread_id)
     if use_tools:
-        graph = create_react_agent(model_instance, tools=tools, prompt=STATE_MODIFIER)
+        graph = _agent_graph(model_instance, tools, model, checkpointer)
     else:
-        graph = create_react_agent(model_instance, tools=[], prompt=STATE_MODIFIER)
+        graph = _agent_graph(model_instance, [], model, checkpointer)
+    MODEL_SETUP_SECONDS.labels(label).observe(time.perf_counter() - stream_started)
     inputs = ""
     accumulated_contents = ""
+    final_turn_contents = ""
     try:
-        inputs = convert_messages_to_langgraph_format(messages)
-        validate_chat_history(inputs["messages"])
-        async for event in graph.astream_events(inputs, version="v2"):
+        if checkpointer:
+            messages = await aprepare_thread(checkpointer, thread_id, messages)
+        conversion_started = time.perf_counter()
+        inputs = build_agent_inputs(messages, model, use_cache=checkpointer is None)
+        MESSAGE_CONVERSION_SECONDS.labels(label).observe(
+            time.perf_counter() - conversion_started
+        )
+        async for event in graph.astream_events(inputs, config=config, version="v2"):
             kind = event["event"]
-            logger.debug(f"event = {event}")
+            logger.debug("event = %s", Truncated(event))
             if kind == "on_chat_model_stream":
                 content = event["data"]["chunk"].content
                 if content:
                     if isinstance(content, str):
-                        current_timestamp = int(time.time())
-                        struct = {
-                            "id": str(uuid.uuid4()),
-                            "object": "thread.message.delta",
-                            "created": current_timestamp,
-                            "thread_id": thread_id,
-                            "model": model,
-                            "choices": [
-                                {
-                                    "delta": {
-                                        "content": content,
-                                        "role": "assistant",
-                                    }
-                                }
-                            ],
-                        }
-                        event_content = format_resp(struct)
-                        logger.debug("Sending event content: " + event_content)
+                        if not first_token_seen:
+                            first_token_seen = True
+                            TIME_TO_FIRST_TOKEN_SECONDS.labels(label).observe(
+                                time.perf_counter() - stream_started
+                            )
+                        event_content = encoder.content(content)
+                        logger.debug("Sending event content: %s", event_content)
                         accumulated_contents += content
+                        final_turn_contents += content
+                        if transcript is not None:
+                            transcript.events.append(["content", content])
                         yield event_content
                     elif isinstance(content, list):
+                        # Raw content blocks are not framed, so cannot be replayed.
+                        transcript = None
                         for item in content:
                             if "type" in item:
                                 if item["type"] == "text":
                                     yield item["text"]
                                 elif item["type"] == "tool_use":
                                     logger.debug("tool_use")
-                                    logger.debug(f"{str(item)}")
+                                    logger.debug("%s", Truncated(item))
                                 else:
                                     logger.debug(
                                         "Received item of type " + item["type"]
                                     )
             elif kind == "on_tool_start":
-                printmsg = f"Starting tool: {event['name']} with inputs: {event['data'].get('input')} run_id: {event['run_id']}"
-                logger.debug(printmsg)
-                current_timestamp = int(time.time())
+                run_timer.start(event["run_id"], event["name"])
+                logger.debug(
+                    "Starting tool: %s with inputs: %s run_id: %s",
+                    event["name"],
+                    Truncated(event["data"].get("input")),
+                    event["run_id"],
+                )
                 step_details = {
                     "type": "tool_calls",
                     "tool_calls": [
@@ -325,90 +429,87 @@ async def get_llm_stream(messages: List[Message], model: str, thread_id: str, to
                         }
                     ],
                 }
-                struct = {
-                    "id": str(uuid.uuid4()),
-                    "object": "thread.run.step.delta",
-                    "thread_id": thread_id,
-                    "model": model,
-                    "created": current_timestamp,
-                    "choices": [
-                        {"delta": {"role": "assistant", "step_details": step_details}}
-                    ],
-                }
                 thinking_step_details = {
                     "type": "thinking",
                     "content": "The user's question will require an internet search using a search tool.",
                 }
-                thinking_struct = {
-                    "id": str(uuid.uuid4()),
-                    "object": "thread.run.step.delta",
-                    "thread_id": thread_id,
-                    "model": model,
-                    "created": current_timestamp,
-                    "choices": [
-                        {
-                            "delta": {
-                                "role": "assistant",
-                                "step_details": thinking_step_details,
-                            }
-                        }
-                    ],
-                }
-                thinking_event_content = format_resp(thinking_struct)
-                logger.info("Sending thinking event content: " + thinking_event_content)
+                thinking_event_content = encoder.step(thinking_step_details)
+                logger.debug(
+                    "Sending thinking event content: %s", thinking_event_content
+                )
                 if send_tool_events:
+                    if transcript is not None:
+                        transcript.events.append(["step", thinking_step_details])
                     yield thinking_event_content
-                event_content = format_resp(struct)
-                logger.info("Sending tool call event content: " + event_content)
+                event_content = encoder.step(step_details)
+                logger.debug(
+                    "Sending tool call event content: %s", Truncated(event_content)
+                )
                 if send_tool_events:
+                    if transcript is not None:
+                        transcript.events.append(["step", step_details])
                     yield event_content
             elif kind == "on_tool_end":
+                stopped = run_timer.stop(event["run_id"])
+                if stopped:
+                    TOOL_CALL_SECONDS.labels(stopped[0]).observe(stopped[1])
                 tool_name = event.get("name", "")
-                logger.info(f"Event on_tool_end for tool: {tool_name}")
+                logger.info("Event on_tool_end for tool: %s", tool_name)
                 output = event.get("data", {}).get("output", {})
                 content = ""
                 if output and output.content:
                     content = output.content
                 run_id = event["run_id"]
-                logger.info(f"Tool output for run {run_id} was: {content}")
+                if log_payloads:
+                    logger.info(
+                        "Tool output for run %s was: %s", run_id, Truncated(content)
+                    )
                 tool_call_id = ""
                 if output and output.tool_call_id:
                     tool_call_id = output.tool_call_id
                 tool_call_id = run_id  # Better matches tool response with tool request
-                current_timestamp = int(time.time())
                 step_details = {
                     "type": "tool_response",
                     "name": event["name"],
                     "tool_call_id": tool_call_id,
                     "content": content,
                 }
-                struct = {
-                    "id": str(uuid.uuid4()),
-                    "object": "thread.run.step.delta",
-                    "thread_id": thread_id,
-                    "model": model,
-                    "created": current_timestamp,
-                    "choices": [
-                        {"delta": {"role": "assistant", "step_details": step_details}}
-                    ],
-                }
-                event_content = format_resp(struct)
-                logger.info("Sending tool response event content: " + event_content)
+                event_content = encoder.step(step_details)
+                logger.debug(
+                    "Sending tool response event content: %s", Truncated(event_content)
+                )
                 if send_tool_events:
+                    if transcript is not None:
+                        transcript.events.append(["step", step_details])
                     yield event_content
             elif kind == "on_chat_model_start":
-                logger.debug(f"Received event type: on_chat_model_start")
+                logger.debug("Received event type: on_chat_model_start")
+                run_timer.start(event["run_id"], label)
+                final_turn_contents = ""
             elif kind == "on_chat_model_end":
-                logger.debug(f"Received event type: on_chat_model_end")
+                logger.debug("Received event type: on_chat_model_end")
+                stopped = run_timer.stop(event["run_id"])
+                if stopped:
+                    LLM_CALL_SECONDS.labels(stopped[0]).observe(stopped[1])
             else:
-                logger.debug("Received event type: " + kind)
+                logger.debug("Received event type: %s", kind)
             yield ""
 
-        if accumulated_contents:
-            logger.info("Final streamed content:\n" + accumulated_contents)
+        if accumulated_contents and log_payloads:
+            logger.info("Final streamed content:\n%s", Truncated(accumulated_contents))
+        if transcript is not None:
+            transcript.content = final_turn_contents
+            transcript.complete = True
 
     except Exception as e:
-        logger.error(f"Exception {str(e)}")
+        logger.error("Exception %s", e)
         traceback.print_exc()
-        logger.error(f"Exception was with inputs {str(inputs)}")
+        logger.error("Exception was with inputs %s", Truncated(inputs))
         yield f"Error: {str(e)}\n"
+    finally:
+        # Counted once per stream: chunks are not tokens once coalesced or
+        # when the provider batches its deltas.
+        if accumulated_contents:
+            STREAMED_TOKENS.labels(label).inc(
+                tokenizer.count(accumulated_contents, tokenizer.encoding_name(model))
+            )
@@ -0,0 +1,105 @@
+import atexit
+import logging
+import queue
+import random
+import reprlib
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+from config import (
+    LOG_LEVEL,
+    LOG_MAX_PAYLOAD_CHARS,
+    LOG_PAYLOAD_SAMPLE_RATE,
+    LOG_QUEUE,
+)
+
+_listener: Optional[QueueListener] = None
+
+# Bounds how much of a nested payload is walked before it is truncated.
+_payload_repr = reprlib.Repr()
+_payload_repr.maxlevel = 4
+_payload_repr.maxlist = _payload_repr.maxtuple = _payload_repr.maxdict = 32
+_payload_repr.maxset = _payload_repr.maxfrozenset = _payload_repr.maxdeque = 32
+_payload_repr.maxstring = _payload_repr.maxother = LOG_MAX_PAYLOAD_CHARS
+
+
+class Truncated:
+    """Log argument that is rendered and truncated only if the record is emitted.
+
+    Pass it as a %-style argument so disabled levels cost nothing. Callables
+    are invoked at render time, e.g. ``Truncated(request.model_dump_json)``.
+    Other values get a bounded repr, so large nested payloads are not walked
+    in full.
+    """
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int = LOG_MAX_PAYLOAD_CHARS):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        value = self.value() if callable(self.value) else self.value
+        text = value if isinstance(value, str) else _payload_repr.repr(value)
+        if len(text) > self.limit:
+            return f"{text[:self.limit]}... [{len(text) - self.limit} chars truncated]"
+        return text
+
+    __repr__ = __str__
+
+
+def sample_payload() -> bool:
+    """Whether this request's large payloads should be logged at all."""
+    return LOG_PAYLOAD_SAMPLE_RATE >= 1.0 or random.random() < LOG_PAYLOAD_SAMPLE_RATE
+
+
+class DeferredQueueHandler(QueueHandler):
+    """Queue handler that leaves message formatting to the listener thread.
+
+    The stock QueueHandler formats every record in the calling thread. Here
+    only exception info and ``Truncated`` arguments are rendered eagerly:
+    tracebacks do not outlive the except block, and payloads such as
+    message lists and graph events may be mutated after the call returns.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if isinstance(record.args, tuple) and any(
+            isinstance(arg, Truncated) for arg in record.args
+        ):
+            record.args = tuple(
+                str(arg) if isinstance(arg, Truncated) else arg for arg in record.args
+            )
+        return record
+
+
+def setup_logging():
+    global _listener
+    logger = logging.getLogger()
+    logger.setLevel(LOG_LEVEL)
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.DEBUG)
+    formatter = logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    console_handler.setFormatter(formatter)
+    if not LOG_QUEUE:
+        logger.addHandler(console_handler)
+        return
+    if _listener is None:
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        logger.addHandler(DeferredQueueHandler(log_queue))
+        _listener = QueueListener(
+            log_queue, console_handler, respect_handler_level=True
+        )
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,167 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Tuple
+from uuid import uuid4
+
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolCall,
+    ToolMessage,
+)
+
+from config import MESSAGE_PREFIX_CACHE_ENABLED, MESSAGE_PREFIX_CACHE_MAX_ENTRIES
+from models import Message
+
+logger = logging.getLogger()
+
+PLACEHOLDER_CONTENT = "Tool call failed or no response received."
+
+
+def _human(msg: Message) -> BaseMessage:
+    return HumanMessage(content=msg.content)
+
+
+def _system(msg: Message) -> BaseMessage:
+    return SystemMessage(content=msg.content)
+
+
+def _assistant(msg: Message) -> BaseMessage:
+    if not msg.tool_calls:
+        return AIMessage(content=msg.content or "")
+    # Arguments were parsed from JSON when the request was validated.
+    tool_calls = [
+        ToolCall(
+            name=call.function.name,
+            args=call.function.arguments,
+            id=call.id,
+            type="tool",
+        )
+        for call in msg.tool_calls
+    ]
+    return AIMessage(content=msg.content or "", tool_calls=tool_calls)
+
+
+def _tool(msg: Message) -> BaseMessage:
+    return ToolMessage(content=msg.content, name=None, tool_call_id=msg.tool_call_id)
+
+
+CONVERTERS: Dict[str, Callable[[Message], BaseMessage]] = {
+    "user": _human,
+    "human": _human,
+    "system": _system,
+    "assistant": _assistant,
+    "tool": _tool,
+}
+
+
+def _content_key(msg: Message) -> Tuple:
+    calls = None
+    if msg.tool_calls:
+        calls = tuple(
+            (
+                call.id,
+                call.function.name,
+                json.dumps(call.function.arguments, sort_keys=True),
+            )
+            for call in msg.tool_calls
+        )
+    return msg.role, msg.content, msg.tool_call_id, calls
+
+
+class MessagePrefixCache:
+    """LRU cache of converted messages keyed by the history leading to them.
+
+    An entry maps (id of the preceding prefix, content of the message) to the
+    converted message and the id of the prefix it completes, so a request
+    that extends an earlier conversation only converts its new messages.
+    Keys hold the content itself rather than a digest, so lookups cannot
+    collide. Cached messages are shared between requests: each gets its id
+    when first converted, as langgraph would otherwise assign one in place.
+    They must not be used for checkpointed threads, where a repeated id
+    replaces the earlier message instead of appending.
+    """
+
+    def __init__(self, max_entries: int = MESSAGE_PREFIX_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[BaseMessage, int]]" = OrderedDict()
+        self._next_prefix = 1
+
+    def convert(self, prefix: int, msg: Message) -> Tuple[BaseMessage, int]:
+        """Returns ``msg`` converted after the prefix ``prefix`` (0 for the
+        start of a history) and the id of the prefix ending with it."""
+        key = (prefix, _content_key(msg))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        message = CONVERTERS[msg.role](msg)
+        message.id = str(uuid4())
+        with self._lock:
+            self.misses += 1
+            entry = self._entries.setdefault(key, (message, self._next_prefix))
+            if entry[0] is message:
+                self._next_prefix += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+message_prefix_cache = MessagePrefixCache()
+
+
+def convert_messages(
+    messages: List[Message], use_cache: bool = False
+) -> List[BaseMessage]:
+    """Converts request messages to langchain messages in one pass.
+
+    Tool calls left without a response get a placeholder ToolMessage
+    appended, in the order the calls appear, as providers reject such
+    histories. With ``use_cache`` (and MESSAGE_PREFIX_CACHE_ENABLED)
+    previously converted prefixes come from ``message_prefix_cache``.
+    """
+    cache = message_prefix_cache if use_cache and MESSAGE_PREFIX_CACHE_ENABLED else None
+    converted = []
+    prefix = 0
+    # Tool call ids in order of appearance, and those with a response.
+    pending: Dict[str, None] = {}
+    answered = set()
+    for msg in messages:
+        if cache is None:
+            converted.append(CONVERTERS[msg.role](msg))
+        else:
+            message, prefix = cache.convert(prefix, msg)
+            converted.append(message)
+        if msg.tool_calls:
+            for call in msg.tool_calls:
+                pending[call.id] = None
+        elif msg.role == "tool":
+            answered.add(msg.tool_call_id)
+    for tool_call_id in pending:
+        if tool_call_id in answered:
+            continue
+        logger.info(
+            "Fixing input that had no tool response for tool_call_id %s", tool_call_id
+        )
+        converted.append(
+            ToolMessage(
+                content=PLACEHOLDER_CONTENT, tool_call_id=tool_call_id, name="unknown"
+            )
+        )
+    return converted
@@ -0,0 +1,239 @@
+import time
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+from completion_cache import completion_cache
+from graph_cache import graph_cache
+from message_conversion import message_prefix_cache
+from tool_cache import tool_cache
+
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+REQUEST_SECONDS = Histogram(
+    "chat_request_seconds",
+    "Total handling time of /chat/completions requests",
+    ["model", "stream"],
+    buckets=SLOW_BUCKETS,
+)
+REQUEST_PARSE_SECONDS = Histogram(
+    "chat_request_parse_seconds",
+    "Time from receiving a request to entering the handler (body parse, validation, auth)",
+    buckets=FAST_BUCKETS,
+)
+MESSAGE_CONVERSION_SECONDS = Histogram(
+    "chat_message_conversion_seconds",
+    "Time spent in convert_messages_to_langgraph_format",
+    ["model"],
+    buckets=FAST_BUCKETS,
+)
+MODEL_SETUP_SECONDS = Histogram(
+    "chat_model_setup_seconds",
+    "Time to obtain the model client and compiled agent graph",
+    ["model"],
+    buckets=FAST_BUCKETS,
+)
+TIME_TO_FIRST_TOKEN_SECONDS = Histogram(
+    "chat_time_to_first_token_seconds",
+    "Time from the start of a stream to its first content token",
+    ["model"],
+    buckets=SLOW_BUCKETS,
+)
+LLM_CALL_SECONDS = Histogram(
+    "chat_llm_call_seconds",
+    "Duration of individual chat model calls within an agent run",
+    ["model"],
+    buckets=SLOW_BUCKETS,
+)
+TOOL_CALL_SECONDS = Histogram(
+    "chat_tool_call_seconds",
+    "Duration of individual tool calls within an agent run",
+    ["tool"],
+    buckets=SLOW_BUCKETS,
+)
+HISTORY_TRIMMED_TOKENS = Counter(
+    "chat_history_trimmed_tokens",
+    "Prompt tokens dropped to fit the model's history budget",
+    ["model"],
+)
+STREAMED_TOKENS = Counter(
+    "chat_streamed_tokens",
+    "Content tokens streamed to clients, counted with the model's tokenizer",
+    ["model"],
+)
+SINGLE_FLIGHT_REQUESTS = Counter(
+    "single_flight_requests",
+    "Requests that started (leader) or joined (follower) a shared agent run",
+    ["stream", "role"],
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "admission_in_flight",
+    "Requests holding an admission slot",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "admission_queue_depth",
+    "Requests waiting for an admission slot",
+    ["priority"],
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "admission_wait_seconds",
+    "Time requests waited for an admission slot",
+    ["priority"],
+    buckets=SLOW_BUCKETS,
+)
+ADMISSION_REJECTED = Counter(
+    "admission_rejected",
+    "Requests rejected by admission control",
+    ["reason", "priority"],
+)
+ROUTER_FAILOVERS = Counter(
+    "router_failovers",
+    "Model calls moved to the next target after the named target failed",
+    ["route", "target"],
+)
+ROUTER_TARGET_LATENCY = Gauge(
+    "router_target_latency_seconds",
+    "Rolling time to first token (stream) or response (generate) of each target",
+    ["target", "kind"],
+)
+ROUTER_TARGET_ERROR_RATE = Gauge(
+    "router_target_error_rate",
+    "Rolling share of failed calls of each routing target",
+    ["target"],
+)
+HEDGE_DECISIONS = Counter(
+    "llm_hedge_decisions",
+    "First model calls by hedging outcome: not_needed, hedged or over_budget",
+    ["model", "decision"],
+)
+HEDGE_WINS = Counter(
+    "llm_hedge_wins",
+    "Hedged calls by which request answered first",
+    ["model", "winner"],
+)
+
+
+def model_label(model: Any) -> str:
+    return getattr(model, "value", None) or str(model)
+
+
+class RunTimer:
+    """Pairs start/end events of nested runs by run_id."""
+
+    def __init__(self):
+        self._started: Dict[Any, tuple] = {}
+
+    def start(self, run_id: Any, label: str):
+        self._started[run_id] = (label, time.perf_counter())
+
+    def stop(self, run_id: Any) -> Optional[tuple]:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return None
+        label, start = started
+        return label, time.perf_counter() - start
+
+
+class AgentMetricsCallback(BaseCallbackHandler):
+    """Records LLM and tool call durations for runs without an event stream."""
+
+    def __init__(self, model: Any):
+        self.model = model_label(model)
+        self._timer = RunTimer()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs):
+        self._timer.start(run_id, self.model)
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs):
+        self._observe(LLM_CALL_SECONDS, run_id)
+
+    def on_llm_error(self, error, *, run_id: UUID, **kwargs):
+        self._observe(LLM_CALL_SECONDS, run_id)
+
+    def on_tool_start(self, serialized, input_str, *, run_id: UUID, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._timer.start(run_id, name)
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs):
+        self._observe(TOOL_CALL_SECONDS, run_id)
+
+    def on_tool_error(self, error, *, run_id: UUID, **kwargs):
+        self._observe(TOOL_CALL_SECONDS, run_id)
+
+    def _observe(self, histogram: Histogram, run_id: UUID):
+        stopped = self._timer.stop(run_id)
+        if stopped is not None:
+            histogram.labels(stopped[0]).observe(stopped[1])
+
+
+class CacheCollector:
+    """Exports the in-process cache counters at scrape time."""
+
+    def collect(self):
+        stats = graph_cache.stats()
+        graph_lookups = CounterMetricFamily(
+            "agent_graph_cache_lookups",
+            "Agent graph cache lookups",
+            labels=["result"],
+        )
+        graph_lookups.add_metric(["hit"], stats["hits"])
+        graph_lookups.add_metric(["miss"], stats["misses"])
+        yield graph_lookups
+        yield GaugeMetricFamily(
+            "agent_graph_cache_size", "Compiled graphs cached", value=stats["size"]
+        )
+        tool_lookups = CounterMetricFamily(
+            "tool_cache_lookups",
+            "Tool result cache lookups",
+            labels=["tool", "result"],
+        )
+        for tool_name, counts in tool_cache.stats().items():
+            for result, count in counts.items():
+                tool_lookups.add_metric([tool_name, result], count)
+        yield tool_lookups
+        stats = completion_cache.stats()
+        completion_lookups = CounterMetricFamily(
+            "completion_cache_lookups",
+            "Completion cache lookups",
+            labels=["result"],
+        )
+        completion_lookups.add_metric(["hit"], stats["hits"])
+        completion_lookups.add_metric(["miss"], stats["misses"])
+        yield completion_lookups
+        yield GaugeMetricFamily(
+            "completion_cache_size",
+            "Completions cached in memory",
+            value=stats["size"],
+        )
+        stats = message_prefix_cache.stats()
+        prefix_lookups = CounterMetricFamily(
+            "message_prefix_cache_lookups",
+            "Converted message cache lookups",
+            labels=["result"],
+        )
+        prefix_lookups.add_metric(["hit"], stats["hits"])
+        prefix_lookups.add_metric(["miss"], stats["misses"])
+        yield prefix_lookups
+        yield GaugeMetricFamily(
+            "message_prefix_cache_size",
+            "Converted messages cached",
+            value=stats["size"],
+        )
+
+
+REGISTRY.register(CacheCollector())
+
+
+def render_metrics():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -19,6 +19,16 @@ class ModelName(str, Enum):
 # DEFAULT_MODEL = ModelName.llama_4_maverick_17b_128e_instruct_fp8
 DEFAULT_MODEL = ModelName.gpt_4_o
 
+# Prompt tokens the conversation history is trimmed to, per model.
+MODEL_TOKEN_BUDGETS = {
+    ModelName.mistral_large: 24000,
+    ModelName.llama_3_1_405b: 32000,
+    ModelName.llama_3_2_90b: 32000,
+    ModelName.llama_4_maverick_17b_128e_instruct_fp8: 32000,
+    ModelName.gpt_4_o_mini: 32000,
+    ModelName.gpt_4_o: 32000,
+}
+
 
 class Function(BaseModel):
     name: str
@@ -123,3 +133,32 @@ class ChatCompletionResponse(BaseModel):
     )
     model: str = Field(..., description="The model used for generating the completion")
     choices: List[Choice] = Field(..., description="List of completion choices")
+
+
+class BatchCompletionRequest(BaseModel):
+    requests: List[ChatCompletionRequest] = Field(
+        ...,
+        description="Independent completion requests; their stream flags are ignored",
+    )
+    stream: Optional[bool] = Field(
+        True,
+        description="Whether to stream results as NDJSON lines as each request finishes",
+    )
+    max_concurrency: Optional[int] = Field(
+        None, description="Requests to run at once, capped by the server's limit"
+    )
+
+
+class BatchCompletionResult(BaseModel):
+    index: int = Field(..., description="Position of the request in the batch")
+    response: Optional[ChatCompletionResponse] = Field(
+        None, description="The completion, if the request succeeded"
+    )
+    error: Optional[str] = Field(None, description="Why the request failed")
+
+
+class BatchCompletionResponse(BaseModel):
+    object: str = Field("batch.completion", description="The type of object returned")
+    results: List[BatchCompletionResult] = Field(
+        ..., description="Results in request order"
+    )
@@ -0,0 +1,357 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    message_chunk_to_message,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+
+from config import LLM_REPLAY_FILE, LLM_REPLAY_MODE, LLM_REPLAY_SPEED
+
+logger = logging.getLogger()
+
+
+class ReplayMissError(KeyError):
+    """Raised in replay mode when a call has no recording."""
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _message_key(message: BaseMessage) -> List[Any]:
+    # Message ids are generated per run and tool call ids by the provider, so
+    # neither takes part in matching a call to its recording.
+    return [
+        message.type,
+        message.content,
+        [[call["name"], call["args"]] for call in getattr(message, "tool_calls", [])],
+    ]
+
+
+def _tool_name(tool: Any) -> str:
+    if isinstance(tool, str):
+        return tool
+    if isinstance(tool, dict):
+        return tool.get("function", {}).get("name") or tool.get("name", "")
+    return getattr(tool, "name", str(tool))
+
+
+def llm_call_key(model: str, messages: Sequence[BaseMessage], kwargs: Dict) -> str:
+    # Bound tools are matched by name; their provider-specific schemas differ
+    # between a recording model and the replay model.
+    kwargs = dict(kwargs)
+    if "tools" in kwargs:
+        kwargs["tools"] = sorted(_tool_name(tool) for tool in kwargs["tools"])
+    payload = [model, [_message_key(m) for m in messages], kwargs]
+    return hashlib.sha256(_canonical(payload).encode()).hexdigest()
+
+
+def tool_call_key(name: str, arguments: Dict) -> str:
+    return hashlib.sha256(_canonical([name, arguments]).encode()).hexdigest()
+
+
+class ReplayStore:
+    """JSON-lines file of recorded model and tool calls.
+
+    Each line holds one call: its kind ("llm" or "tool"), a key derived from
+    the call's inputs and the result with its timing. A key recorded several
+    times is replayed in recording order, wrapping around at the end.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._records: Optional[Dict[str, List[Dict]]] = None
+        self._cursors: Dict[str, int] = defaultdict(int)
+
+    def append(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(line + "\n")
+
+    def _load(self) -> Dict[str, List[Dict]]:
+        records: Dict[str, List[Dict]] = defaultdict(list)
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    records[record["key"]].append(record)
+        logger.info("Loaded %d recorded calls from %s", len(records), self.path)
+        return records
+
+    def next(self, key: str, description: str) -> Dict:
+        with self._lock:
+            if self._records is None:
+                self._records = self._load()
+            recorded = self._records.get(key)
+            if not recorded:
+                raise ReplayMissError(f"No recording of {description} ({key[:12]})")
+            cursor = self._cursors[key]
+            self._cursors[key] = cursor + 1
+            return recorded[cursor % len(recorded)]
+
+
+replay_store = ReplayStore(LLM_REPLAY_FILE)
+
+
+def _realtime() -> bool:
+    return LLM_REPLAY_SPEED == "realtime"
+
+
+def _dump_message(message: BaseMessage) -> Dict:
+    return message_to_dict(message)
+
+
+def _load_message(data: Dict) -> BaseMessage:
+    return messages_from_dict([data])[0]
+
+
+def _to_chunk(message: AIMessage) -> AIMessageChunk:
+    return AIMessageChunk(
+        content=message.content,
+        additional_kwargs=message.additional_kwargs,
+        response_metadata=message.response_metadata,
+        usage_metadata=message.usage_metadata,
+        id=message.id,
+        tool_call_chunks=[
+            {
+                "name": call["name"],
+                "args": json.dumps(call["args"]),
+                "id": call["id"],
+                "index": index,
+            }
+            for index, call in enumerate(message.tool_calls)
+        ],
+    )
+
+
+def _recorded_chunks(record: Dict) -> List[tuple]:
+    """(offset seconds, chunk) pairs of a recorded call, whichever way it ran."""
+    if "chunks" in record:
+        return [(offset, _load_message(data)) for offset, data in record["chunks"]]
+    offset, data = record["message"]
+    return [(offset, _to_chunk(_load_message(data)))]
+
+
+def _recorded_message(record: Dict) -> tuple:
+    """(elapsed seconds, message) of a recorded call, whichever way it ran."""
+    if "message" in record:
+        elapsed, data = record["message"]
+        return elapsed, _load_message(data)
+    chunks = _recorded_chunks(record)
+    merged = chunks[0][1]
+    for _, chunk in chunks[1:]:
+        merged = merged + chunk
+    return chunks[-1][0], message_chunk_to_message(merged)
+
+
+class RecordingChatModel(BaseChatModel):
+    """Passes calls through to ``inner`` and records each response.
+
+    Streamed calls keep every chunk with its offset from the start of the
+    call so a replay can reproduce the upstream's pacing.
+    """
+
+    inner: BaseChatModel
+    model_name: str
+    store: Any = replay_store
+    bound_tools: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording-" + self.inner._llm_type
+
+    def bind_tools(self, tools, **kwargs):
+        bound = self.inner.bind_tools(tools, **kwargs)
+        if isinstance(bound, BaseChatModel):
+            # Models that bind tools onto a copy of themselves, e.g. local stubs.
+            names = [_tool_name(tool) for tool in tools]
+            return self.model_copy(update={"inner": bound, "bound_tools": names})
+        return self.bind(**getattr(bound, "kwargs", {}))
+
+    def _record(self, messages, kwargs, **result):
+        if self.bound_tools:
+            kwargs = {"tools": self.bound_tools, **kwargs}
+        key = llm_call_key(self.model_name, messages, kwargs)
+        self.store.append(
+            {"kind": "llm", "key": key, "model": self.model_name, **result}
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        started = time.monotonic()
+        result = self.inner._generate(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+        message = result.generations[0].message
+        self._record(
+            messages,
+            kwargs,
+            message=[time.monotonic() - started, _dump_message(message)],
+        )
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        started = time.monotonic()
+        result = await self.inner._agenerate(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        )
+        message = result.generations[0].message
+        self._record(
+            messages,
+            kwargs,
+            message=[time.monotonic() - started, _dump_message(message)],
+        )
+        return result
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        started = time.monotonic()
+        chunks = []
+        async for chunk in self.inner._astream(
+            messages, stop=stop, run_manager=run_manager, **kwargs
+        ):
+            chunks.append([time.monotonic() - started, _dump_message(chunk.message)])
+            yield chunk
+        self._record(messages, kwargs, chunks=chunks)
+
+
+class ReplayChatModel(BaseChatModel):
+    """Answers calls from a recording without contacting any upstream.
+
+    With ``LLM_REPLAY_SPEED=realtime`` responses are paced like the recorded
+    calls, with ``fast`` they are returned as soon as they are looked up.
+    """
+
+    model_name: str
+    store: Any = replay_store
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools, **kwargs):
+        # Tools are only part of the lookup key, so their names are enough.
+        return self.bind(tools=[_tool_name(tool) for tool in tools], **kwargs)
+
+    def _lookup(self, messages, kwargs) -> Dict:
+        key = llm_call_key(self.model_name, messages, kwargs)
+        return self.store.next(key, f"{self.model_name} call")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        elapsed, message = _recorded_message(self._lookup(messages, kwargs))
+        if _realtime():
+            time.sleep(elapsed)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        elapsed, message = _recorded_message(self._lookup(messages, kwargs))
+        if _realtime():
+            await asyncio.sleep(elapsed)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        started = time.monotonic()
+        for offset, chunk in _recorded_chunks(self._lookup(messages, kwargs)):
+            if _realtime():
+                await asyncio.sleep(max(started + offset - time.monotonic(), 0.0))
+            yield ChatGenerationChunk(message=chunk)
+
+
+def recording_enabled() -> bool:
+    return LLM_REPLAY_MODE == "record"
+
+
+def replay_enabled() -> bool:
+    return LLM_REPLAY_MODE == "replay"
+
+
+def _record_tool(tool: BaseTool, func, coroutine) -> BaseTool:
+    def record(arguments, started, output):
+        replay_store.append(
+            {
+                "kind": "tool",
+                "key": tool_call_key(tool.name, arguments),
+                "tool": tool.name,
+                "output": [time.monotonic() - started, output],
+            }
+        )
+
+    def recorded_func(**kwargs):
+        started = time.monotonic()
+        output = func(**kwargs)
+        record(kwargs, started, output)
+        return output
+
+    async def recorded_coroutine(**kwargs):
+        started = time.monotonic()
+        output = await coroutine(**kwargs)
+        record(kwargs, started, output)
+        return output
+
+    return tool.model_copy(
+        update={
+            "func": recorded_func if func else None,
+            "coroutine": recorded_coroutine if coroutine else None,
+        }
+    )
+
+
+def _replay_tool(tool: BaseTool) -> BaseTool:
+    def lookup(kwargs):
+        key = tool_call_key(tool.name, kwargs)
+        return replay_store.next(key, f"{tool.name} tool call")["output"]
+
+    def replayed_func(**kwargs):
+        elapsed, output = lookup(kwargs)
+        if _realtime():
+            time.sleep(elapsed)
+        return output
+
+    async def replayed_coroutine(**kwargs):
+        elapsed, output = lookup(kwargs)
+        if _realtime():
+            await asyncio.sleep(elapsed)
+        return output
+
+    return tool.model_copy(
+        update={"func": replayed_func, "coroutine": replayed_coroutine}
+    )
+
+
+_wrapped_tools: Dict[int, tuple] = {}
+
+
+def replay_tools(tools: Sequence[BaseTool]) -> List[BaseTool]:
+    """Wraps tools for the active LLM_REPLAY_MODE; unchanged when it is off."""
+    if not (recording_enabled() or replay_enabled()):
+        return list(tools)
+    wrapped = []
+    for tool in tools:
+        entry = _wrapped_tools.get(id(tool))
+        if entry is None or entry[0] is not tool:
+            func = getattr(tool, "func", None)
+            coroutine = getattr(tool, "coroutine", None)
+            if func is None and coroutine is None:
+                logger.warning("Tool %s cannot be recorded or replayed", tool.name)
+                entry = (tool, tool)
+            elif replay_enabled():
+                entry = (tool, _replay_tool(tool))
+            else:
+                entry = (tool, _record_tool(tool, func, coroutine))
+            _wrapped_tools[id(tool)] = entry
+        wrapped.append(entry[1])
+    return wrapped
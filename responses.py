@@ -0,0 +1,50 @@
+import logging
+from typing import Any
+
+import pydantic_core
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from config import RESPONSE_JSON_BACKEND
+
+logger = logging.getLogger()
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if RESPONSE_JSON_BACKEND == "orjson" and orjson is None:
+    logger.warning("orjson is not installed, serializing responses with pydantic")
+
+
+def _model_dump(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def json_bytes(content: Any) -> bytes:
+    """Serializes pydantic models, or plain data holding them, to UTF-8 JSON.
+
+    By default pydantic's serializer writes the models directly in a single
+    pass. With the orjson backend the models are first converted with
+    ``model_dump`` and the result encoded. Non-ASCII text is kept as is
+    rather than escaped.
+    """
+    if orjson is not None and RESPONSE_JSON_BACKEND == "orjson":
+        return orjson.dumps(content, default=_model_dump)
+    return pydantic_core.to_json(content)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with ``json_bytes``.
+
+    Return an instance from an endpoint (rather than the model itself) so
+    FastAPI does not first convert the model with ``jsonable_encoder``.
+    """
+
+    media_type = "application/json; charset=utf-8"
+
+    def render(self, content: Any) -> bytes:
+        return json_bytes(content)
@@ -0,0 +1,319 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.runnables import RunnableBinding
+from pydantic import PrivateAttr
+
+from config import (
+    MODEL_GROUPS,
+    ROUTER_CALL_TIMEOUT,
+    ROUTER_COOLDOWN_SECONDS,
+    ROUTER_ENABLED,
+    ROUTER_FAILURE_THRESHOLD,
+    ROUTER_FIRST_TOKEN_TIMEOUT,
+    WATSONX_REGIONS,
+)
+from llm_clients import _freeze, get_provider, model_clients, set_model_router
+from metrics import (
+    ROUTER_FAILOVERS,
+    ROUTER_TARGET_ERROR_RATE,
+    ROUTER_TARGET_LATENCY,
+    model_label,
+)
+from models import ModelName
+
+logger = logging.getLogger()
+
+# Weight of the newest observation in the rolling latency and error rate.
+EWMA_ALPHA = 0.2
+
+
+class Target(NamedTuple):
+    model: str
+    region: Optional[str]
+
+    @property
+    def label(self) -> str:
+        if self.region is None:
+            return self.model
+        return f"{self.model}@{urlparse(self.region).hostname or self.region}"
+
+
+class TargetStats:
+    def __init__(self):
+        # Rolling latency per call kind: "stream" is time to first chunk,
+        # "generate" the whole call, so the two are never mixed.
+        self.latency: Dict[str, float] = {}
+        self.error_rate = 0.0
+        self.failures = 0
+        self.open_until = 0.0
+
+
+def is_failover_error(error: BaseException) -> bool:
+    """Timeouts, connection failures and 5xx responses are worth a retry
+    elsewhere; client errors such as 400 or 401 would fail on any target."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    name = type(error).__name__
+    if "Timeout" in name or "Connection" in name:
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status, int) and status >= 500
+
+
+class ModelRouter:
+    """Tracks per-target latency and errors and orders targets by them.
+
+    A target is a model in one region (watsonx URL). Healthy targets are
+    ordered by rolling latency for the call kind, inflated by their error
+    rate. Targets without measurements go first so they get measured, but
+    last if they have failed since their last success. After
+    ``failure_threshold`` consecutive failures a target is skipped for
+    ``cooldown`` seconds, then tried again.
+    """
+
+    def __init__(
+        self,
+        groups: Dict[str, List[str]] = MODEL_GROUPS,
+        failure_threshold: int = ROUTER_FAILURE_THRESHOLD,
+        cooldown: float = ROUTER_COOLDOWN_SECONDS,
+    ):
+        self.groups = groups
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._stats: Dict[Target, TargetStats] = {}
+        self._routed: Dict[Tuple, "RoutedChatModel"] = {}
+
+    def routes(self, name: str) -> bool:
+        return name in self.groups or name in ModelName._value2member_map_
+
+    def targets(self, name: str) -> List[Target]:
+        targets = []
+        for model in self.groups.get(name, [model_label(name)]):
+            if get_provider(model) == "watsonx":
+                targets.extend(Target(model, region) for region in WATSONX_REGIONS)
+            else:
+                targets.append(Target(model, None))
+        return targets
+
+    def get(self, name: str, overrides: Optional[dict] = None) -> "RoutedChatModel":
+        key = (name, _freeze(overrides or {}))
+        with self._lock:
+            if key not in self._routed:
+                self._routed[key] = RoutedChatModel(
+                    route=model_label(name),
+                    targets=self.targets(name),
+                    overrides=dict(overrides or {}),
+                )
+            return self._routed[key]
+
+    def _stats_for(self, target: Target) -> TargetStats:
+        stats = self._stats.get(target)
+        if stats is None:
+            stats = self._stats.setdefault(target, TargetStats())
+        return stats
+
+    def order(self, targets: Sequence[Target], kind: str) -> List[Target]:
+        now = time.monotonic()
+
+        def score(target: Target) -> Tuple[int, float]:
+            stats = self._stats_for(target)
+            latency = stats.latency.get(kind)
+            if latency is None:
+                if stats.failures:
+                    return 2, float(stats.failures)
+                return 0, 0.0
+            return 1, latency / max(1.0 - stats.error_rate, 0.05)
+
+        healthy = [t for t in targets if self._stats_for(t).open_until <= now]
+        cooling = [t for t in targets if self._stats_for(t).open_until > now]
+        healthy.sort(key=score)
+        cooling.sort(key=lambda t: self._stats_for(t).open_until)
+        return healthy + cooling
+
+    def record_success(self, target: Target, kind: str, latency: float):
+        with self._lock:
+            stats = self._stats_for(target)
+            previous = stats.latency.get(kind)
+            if previous is not None:
+                latency = previous + EWMA_ALPHA * (latency - previous)
+            stats.latency[kind] = latency
+            stats.error_rate -= EWMA_ALPHA * stats.error_rate
+            stats.failures = 0
+            stats.open_until = 0.0
+        ROUTER_TARGET_LATENCY.labels(target.label, kind).set(latency)
+        ROUTER_TARGET_ERROR_RATE.labels(target.label).set(stats.error_rate)
+
+    def record_failure(self, target: Target):
+        with self._lock:
+            stats = self._stats_for(target)
+            stats.error_rate += EWMA_ALPHA * (1.0 - stats.error_rate)
+            stats.failures += 1
+            if stats.failures >= self.failure_threshold:
+                stats.open_until = time.monotonic() + self.cooldown
+                logger.warning(
+                    "Routing around %s for %.0fs after %d failures",
+                    target.label,
+                    self.cooldown,
+                    stats.failures,
+                )
+        ROUTER_TARGET_ERROR_RATE.labels(target.label).set(stats.error_rate)
+
+
+class RoutedChatModel(BaseChatModel):
+    """Chat model that sends each call to the best target of a route.
+
+    Calls go to the underlying provider models' ``_agenerate``/``_astream``
+    directly, so the agent sees one model run per call. A call that fails
+    with a timeout, connection error or 5xx before producing output is
+    retried on the next target; every target but the last is given
+    ``ROUTER_FIRST_TOKEN_TIMEOUT`` to start streaming and
+    ``ROUTER_CALL_TIMEOUT`` to answer a non-stream call.
+    """
+
+    route: str
+    targets: List[Target]
+    # Parameter overrides given for the route; they are provider specific,
+    # so targets of other providers are built without them.
+    overrides: Dict[str, Any] = {}
+    tools: List[Any] = []
+    tool_kwargs: Dict[str, Any] = {}
+    # id(provider model) -> (tool-bound model, call kwargs, provider model);
+    # the provider model is kept to detect ids reused after eviction.
+    _bound: Dict[int, Tuple[BaseChatModel, Dict[str, Any], BaseChatModel]] = (
+        PrivateAttr(default_factory=dict)
+    )
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed"
+
+    def bind_tools(self, tools, **kwargs):
+        routed = self.model_copy(update={"tools": list(tools), "tool_kwargs": kwargs})
+        routed._bound = {}
+        return routed
+
+    def _prepare(self, instance: BaseChatModel) -> Tuple[BaseChatModel, Dict]:
+        prepared = self._bound.get(id(instance))
+        if prepared is None or prepared[2] is not instance:
+            model, kwargs = instance, {}
+            if self.tools:
+                bound = instance.bind_tools(self.tools, **self.tool_kwargs)
+                if isinstance(bound, RunnableBinding):
+                    model, kwargs = bound.bound, bound.kwargs
+                else:
+                    model = bound
+            prepared = (model, kwargs, instance)
+            self._bound[id(instance)] = prepared
+        return prepared[0], prepared[1]
+
+    def _client_args(self, target: Target) -> Tuple:
+        overrides = None
+        if get_provider(target.model) == get_provider(self.route):
+            overrides = self.overrides
+        return target.model, overrides, target.region
+
+    def _failover(self, target: Target, error: BaseException, last: bool) -> bool:
+        # Client errors such as 400 or 401 say nothing about the target's
+        # health, so they neither count towards its circuit nor fail over.
+        if not is_failover_error(error):
+            return False
+        model_router.record_failure(target)
+        if last:
+            return False
+        logger.warning("%s failed, failing over: %r", target.label, error)
+        ROUTER_FAILOVERS.labels(self.route, target.label).inc()
+        return True
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        targets = model_router.order(self.targets, "generate")
+        for position, target in enumerate(targets):
+            model, bound_kwargs = self._prepare(
+                model_clients.get(*self._client_args(target))
+            )
+            started = time.monotonic()
+            try:
+                result = model._generate(
+                    messages,
+                    stop=stop,
+                    run_manager=run_manager,
+                    **bound_kwargs,
+                    **kwargs,
+                )
+            except Exception as e:
+                if self._failover(target, e, position == len(targets) - 1):
+                    continue
+                raise
+            model_router.record_success(target, "generate", time.monotonic() - started)
+            return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        targets = model_router.order(self.targets, "generate")
+        for position, target in enumerate(targets):
+            last = position == len(targets) - 1
+            instance = await model_clients.aget(*self._client_args(target))
+            model, bound_kwargs = self._prepare(instance)
+            started = time.monotonic()
+            call = model._agenerate(
+                messages, stop=stop, run_manager=run_manager, **bound_kwargs, **kwargs
+            )
+            try:
+                result = await asyncio.wait_for(
+                    call, None if last else ROUTER_CALL_TIMEOUT
+                )
+            except Exception as e:
+                if self._failover(target, e, last):
+                    continue
+                raise
+            model_router.record_success(target, "generate", time.monotonic() - started)
+            return result
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        targets = model_router.order(self.targets, "stream")
+        for position, target in enumerate(targets):
+            last = position == len(targets) - 1
+            instance = await model_clients.aget(*self._client_args(target))
+            model, bound_kwargs = self._prepare(instance)
+            started = time.monotonic()
+            chunks = model._astream(
+                messages, stop=stop, run_manager=run_manager, **bound_kwargs, **kwargs
+            )
+            try:
+                first = await asyncio.wait_for(
+                    chunks.__anext__(), None if last else ROUTER_FIRST_TOKEN_TIMEOUT
+                )
+            except StopAsyncIteration:
+                model_router.record_success(
+                    target, "stream", time.monotonic() - started
+                )
+                return
+            except Exception as e:
+                await chunks.aclose()
+                if self._failover(target, e, last):
+                    continue
+                raise
+            # Latency is time to first chunk; failures after it are not
+            # retried because output has already reached the client.
+            model_router.record_success(target, "stream", time.monotonic() - started)
+            yield first
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            except Exception as e:
+                if is_failover_error(e):
+                    model_router.record_failure(target)
+                raise
+            return
+
+
+model_router = ModelRouter()
+if ROUTER_ENABLED:
+    set_model_router(model_router)
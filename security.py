@@ -1,8 +1,11 @@
+import hashlib
 from typing import Any, Dict, Optional
 
 from fastapi import Depends
 from fastapi.security import APIKeyHeader, HTTPAuthorizationCredentials, HTTPBearer
 
+ANONYMOUS_IDENTITY = "anonymous"
+
 # This example allows any bearer or api keys to be valid
 api_key_header = APIKeyHeader(name="X-API-Key", auto_error=False)
 http_bearer = HTTPBearer(auto_error=False)
@@ -23,3 +26,12 @@ async def get_current_user(
     token: Optional[str] = Depends(get_bearer_token),
 ) -> Dict[str, Any]:
     return {"api_key": api_key, "token": token}
+
+
+def caller_identity(current_user: Dict[str, Any]) -> str:
+    """Stable, non-reversible name of the caller for limits and metrics."""
+    for kind in ("api_key", "token"):
+        secret = current_user.get(kind)
+        if secret:
+            return f"{kind}:{hashlib.sha256(secret.encode()).hexdigest()[:16]}"
+    return ANONYMOUS_IDENTITY
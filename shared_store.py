@@ -0,0 +1,212 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator, Optional, Tuple
+
+from config import SHARED_STORE_BACKEND, SHARED_STORE_PATH
+
+logger = logging.getLogger()
+
+# Expired entries are swept after this many writes to a store.
+SWEEP_EVERY = 256
+
+
+@contextlib.contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Exclusive lock held across processes (and threads) on this host."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class SharedNamespace:
+    """One namespace of a shared store, with the get/set/clear interface of
+    ``completion_cache.SqliteCompletionStore``."""
+
+    def __init__(self, store, namespace: str):
+        self._store = store
+        self._namespace = namespace
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        return self._store.get(self._namespace, key)
+
+    def set(self, key: str, value: str, expires_at: float):
+        self._store.set(self._namespace, key, value, expires_at)
+
+    def clear(self):
+        self._store.clear(self._namespace)
+
+
+class SqliteSharedStore:
+    """Key-value state shared by the worker processes of one host.
+
+    Values are strings with an absolute expiry; each write is a single
+    transaction, so readers see either the old or the new value. The
+    connection is opened lazily and reopened after a fork.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._writes = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            created = not os.path.exists(self.path)
+            conn = sqlite3.connect(
+                self.path, timeout=10, check_same_thread=False, isolation_level=None
+            )
+            if created:
+                # May hold credentials such as the IAM token.
+                os.chmod(self.path, 0o600)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS shared_state (namespace TEXT NOT NULL, "
+                "key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS shared_state_expires_at "
+                "ON shared_state (expires_at)"
+            )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = (
+                self._connection()
+                .execute(
+                    "SELECT value, expires_at FROM shared_state "
+                    "WHERE namespace = ? AND key = ? AND expires_at > ?",
+                    (namespace, key, time.time()),
+                )
+                .fetchone()
+            )
+        return row
+
+    def set(self, namespace: str, key: str, value: str, expires_at: float):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO shared_state VALUES (?, ?, ?, ?)",
+                (namespace, key, value, expires_at),
+            )
+            self._writes += 1
+            if self._writes % SWEEP_EVERY == 0:
+                conn.execute(
+                    "DELETE FROM shared_state WHERE expires_at < ?", (time.time(),)
+                )
+
+    def clear(self, namespace: str):
+        with self._lock:
+            self._connection().execute(
+                "DELETE FROM shared_state WHERE namespace = ?", (namespace,)
+            )
+
+    def lock(self, name: str):
+        return file_lock(f"{self.path}.{name}.lock")
+
+    def namespace(self, name: str) -> SharedNamespace:
+        return SharedNamespace(self, name)
+
+
+class FileSharedStore:
+    """Key-value state shared through one file per key in a directory.
+
+    Writes go to a temporary file that is renamed over the old one, so
+    readers never see a partial value and need no lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._writes = 0
+        os.makedirs(path, mode=0o700, exist_ok=True)
+
+    def _file(self, namespace: str, key: str) -> str:
+        return os.path.join(self.path, f"{namespace}-{_digest(key)[:32]}.json")
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[str, float]]:
+        try:
+            with open(self._file(namespace, key)) as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if entry["key"] != key or entry["expires_at"] <= time.time():
+            return None
+        return entry["value"], entry["expires_at"]
+
+    def set(self, namespace: str, key: str, value: str, expires_at: float):
+        target = self._file(namespace, key)
+        temporary = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as file:
+            json.dump({"key": key, "value": value, "expires_at": expires_at}, file)
+        os.replace(temporary, target)
+        self._writes += 1
+        if self._writes % SWEEP_EVERY == 0:
+            self._sweep()
+
+    def _sweep(self):
+        now = time.time()
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                with open(path) as file:
+                    expired = json.load(file)["expires_at"] <= now
+                if expired:
+                    os.remove(path)
+            except (OSError, ValueError, KeyError):
+                continue
+
+    def clear(self, namespace: str):
+        for name in os.listdir(self.path):
+            if name.startswith(f"{namespace}-") and name.endswith(".json"):
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(self.path, name))
+
+    def lock(self, name: str):
+        return file_lock(os.path.join(self.path, f"{name}.lock"))
+
+    def namespace(self, name: str) -> SharedNamespace:
+        return SharedNamespace(self, name)
+
+
+_lock = threading.Lock()
+_shared_store = None
+
+
+def get_shared_store():
+    """The host-wide store selected by SHARED_STORE_BACKEND, or None."""
+    global _shared_store
+    if _shared_store is None and SHARED_STORE_BACKEND in ("sqlite", "file"):
+        with _lock:
+            if _shared_store is None:
+                if SHARED_STORE_BACKEND == "sqlite":
+                    _shared_store = SqliteSharedStore(SHARED_STORE_PATH)
+                else:
+                    _shared_store = FileSharedStore(SHARED_STORE_PATH)
+                logger.info(
+                    "Sharing state across workers via %s store at %s",
+                    SHARED_STORE_BACKEND,
+                    SHARED_STORE_PATH,
+                )
+    return _shared_store
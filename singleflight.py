@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+
+from checkpoints import checkpointing_enabled
+from config import SINGLE_FLIGHT_ENABLED
+from metrics import SINGLE_FLIGHT_REQUESTS
+
+logger = logging.getLogger()
+
+
+def single_flight_enabled(thread_id: str) -> bool:
+    # Checkpointed threads depend on state outside the request, so identical
+    # request bodies are not interchangeable.
+    return SINGLE_FLIGHT_ENABLED and not (thread_id and checkpointing_enabled())
+
+
+class StreamFlight:
+    """One agent run whose stream events are fanned out to every subscriber.
+
+    Events are ("content", text), ("step", step_details) or ("raw", frame)
+    for text the run writes without an encoder. They are kept for the life
+    of the flight so subscribers that join late still get the full sequence.
+    """
+
+    def __init__(self):
+        self.events: List[Tuple[str, Any]] = []
+        self.done = False
+        self.subscribers = 0
+        self.task: asyncio.Task = None
+        self._changed = asyncio.Event()
+
+    def publish(self, kind: str, value: Any):
+        self.events.append((kind, value))
+        self._wake()
+
+    def finish(self):
+        self.done = True
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[Tuple[str, Any]]:
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done:
+                return
+            await self._changed.wait()
+
+
+class _EventEncoder:
+    """Takes the place of a frame encoder and publishes its calls instead."""
+
+    def __init__(self, flight: StreamFlight):
+        self._flight = flight
+
+    def content(self, text: str) -> str:
+        self._flight.publish("content", text)
+        return ""
+
+    def step(self, step_details: Dict[str, Any]) -> str:
+        self._flight.publish("step", step_details)
+        return ""
+
+
+class SingleFlight:
+    """Shares one execution between identical concurrent requests.
+
+    Non-stream callers await a shared task; stream callers subscribe to a
+    shared ``StreamFlight``. A stream run is cancelled once its last
+    subscriber leaves, a non-stream run always completes. Finished flights
+    are forgotten, so only requests that overlap in time are coalesced.
+    Must only be used from the event loop thread.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, StreamFlight] = {}
+
+    async def call(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is None:
+            SINGLE_FLIGHT_REQUESTS.labels("false", "leader").inc()
+            future = asyncio.ensure_future(factory())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            SINGLE_FLIGHT_REQUESTS.labels("false", "follower").inc()
+        return await asyncio.shield(future)
+
+    async def stream(
+        self,
+        key: str,
+        run: Callable[[Any], AsyncIterator[str]],
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Yields the events of the flight for ``key``, starting it if needed.
+
+        ``run(encoder)`` produces the frames of the agent run; it is called
+        with an encoder that turns content and step calls into events.
+        """
+        flight = self._streams.get(key)
+        if flight is None:
+            SINGLE_FLIGHT_REQUESTS.labels("true", "leader").inc()
+            flight = StreamFlight()
+            self._streams[key] = flight
+            flight.task = asyncio.create_task(self._run_stream(key, flight, run))
+        else:
+            SINGLE_FLIGHT_REQUESTS.labels("true", "follower").inc()
+        flight.subscribers += 1
+        try:
+            async for event in flight.subscribe():
+                yield event
+        finally:
+            flight.subscribers -= 1
+            if not flight.subscribers and not flight.done:
+                logger.info("All subscribers left, cancelling shared stream")
+                self._forget(key, flight)
+                flight.task.cancel()
+
+    async def _run_stream(self, key: str, flight: StreamFlight, run):
+        try:
+            async for frame in run(_EventEncoder(flight)):
+                if frame:
+                    flight.publish("raw", frame)
+        except Exception as e:
+            logger.error("Shared stream failed: %s", e)
+            flight.publish("raw", f"Error: {str(e)}\n")
+        finally:
+            self._forget(key, flight)
+            flight.finish()
+
+    def _forget(self, key: str, flight: StreamFlight):
+        if self._streams.get(key) is flight:
+            del self._streams[key]
+
+
+single_flight = SingleFlight()
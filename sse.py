@@ -0,0 +1,175 @@
+import asyncio
+import itertools
+import json
+import time
+import uuid
+from json.encoder import encode_basestring
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+class StreamFrameEncoder:
+    """Builds the SSE frames of one streamed completion.
+
+    The envelope shared by every frame of the stream (object, thread_id,
+    model, role) is serialized once; per frame only the id, the creation
+    second and the delta are spliced in. Frames decode to the same JSON as
+    ``format_resp`` on the equivalent dict, with ids of the form
+    ``<stream uuid>-<sequence>`` instead of a fresh uuid4 per frame.
+    """
+
+    def __init__(self, thread_id: str, model: str):
+        self._stream_id = uuid.uuid4().hex
+        self._sequence = itertools.count()
+        envelope = f', "thread_id": {_dumps(thread_id)}, "model": {_dumps(model)}'
+        self._message_tail = envelope + ', "choices": [{"delta": {"content": '
+        self._step_head = '", "object": "thread.run.step.delta"' + envelope
+        self._created = -1
+        self._message_head = ""
+        self._step_created = ""
+
+    def _next_id(self) -> str:
+        return f"{self._stream_id}-{next(self._sequence)}"
+
+    def _refresh_created(self):
+        now = int(time.time())
+        if now != self._created:
+            self._created = now
+            self._message_head = (
+                '", "object": "thread.message.delta", "created": ' + str(now)
+            )
+            self._step_created = ', "created": ' + str(now)
+
+    def content(self, text: str) -> str:
+        self._refresh_created()
+        return (
+            'data: {"id": "'
+            + self._next_id()
+            + self._message_head
+            + self._message_tail
+            + encode_basestring(text)
+            + ', "role": "assistant"}}]}\n\n'
+        )
+
+    def step(self, step_details: Dict[str, Any]) -> str:
+        self._refresh_created()
+        return (
+            'data: {"id": "'
+            + self._next_id()
+            + self._step_head
+            + self._step_created
+            + ', "choices": [{"delta": {"role": "assistant", "step_details": '
+            + _dumps(step_details)
+            + "}}]}\n\n"
+        )
+
+
+HEARTBEAT = ": keep-alive\n\n"
+
+
+class CoalescingFrameEncoder(StreamFrameEncoder):
+    """Frame encoder that buffers content deltas into fewer, larger frames.
+
+    Content is held until ``max_chars`` accumulate or ``window`` seconds pass
+    since the first buffered delta; step frames flush the buffer first so
+    ordering is preserved. Time-based flushes are driven by ``pace_frames``.
+    """
+
+    def __init__(self, thread_id: str, model: str, window: float, max_chars: int):
+        super().__init__(thread_id, model)
+        self.window = window
+        self.max_chars = max_chars
+        self._pending: List[str] = []
+        self._pending_chars = 0
+        self._pending_since = 0.0
+
+    def content(self, text: str) -> str:
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        self._pending.append(text)
+        self._pending_chars += len(text)
+        if self._pending_chars >= self.max_chars:
+            return self.flush()
+        return ""
+
+    def step(self, step_details: Dict[str, Any]) -> str:
+        return self.flush() + super().step(step_details)
+
+    def flush(self) -> str:
+        if not self._pending:
+            return ""
+        text = "".join(self._pending)
+        self._pending.clear()
+        self._pending_chars = 0
+        return super().content(text)
+
+    def time_until_flush(self) -> Optional[float]:
+        if not self._pending:
+            return None
+        return max(self._pending_since + self.window - time.monotonic(), 0.0)
+
+
+async def pace_frames(
+    frames: AsyncIterator[str],
+    encoder: CoalescingFrameEncoder,
+    heartbeat_interval: float,
+) -> AsyncIterator[str]:
+    """Writes frames from ``frames`` in batches, flushing on the encoder's
+    window and sending SSE comment heartbeats while the stream is idle.
+
+    The source is drained by a single pump task so the consumer can wake up
+    on timers without interrupting it. Empty frames are never written.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for frame in frames:
+                # Empty frames still wake the consumer to re-arm its flush timer.
+                queue.put_nowait(frame)
+        except Exception as e:
+            queue.put_nowait(e)
+        queue.put_nowait(done)
+
+    task = asyncio.create_task(pump())
+    last_write = time.monotonic()
+    try:
+        while True:
+            flush_in = encoder.time_until_flush()
+            heartbeat_in = last_write + heartbeat_interval - time.monotonic()
+            timeout = heartbeat_in if flush_in is None else min(flush_in, heartbeat_in)
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=max(timeout, 0.0))
+            except asyncio.TimeoutError:
+                batch = encoder.flush() if encoder.time_until_flush() == 0 else ""
+                if not batch and time.monotonic() - last_write >= heartbeat_interval:
+                    batch = HEARTBEAT
+                if batch:
+                    last_write = time.monotonic()
+                    yield batch
+                continue
+            batch = []
+            finished = False
+            while True:
+                if item is done:
+                    finished = True
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                batch.append(item)
+                if queue.empty():
+                    break
+                item = queue.get_nowait()
+            if finished:
+                batch.append(encoder.flush())
+            if any(batch):
+                last_write = time.monotonic()
+                yield "".join(batch)
+            if finished:
+                break
+    finally:
+        task.cancel()
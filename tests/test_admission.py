@@ -0,0 +1,169 @@
+import asyncio
+
+import httpx
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+from security import ANONYMOUS_IDENTITY
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_requests_over_the_limit_wait_for_a_slot():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, queue_size=4)
+        first = await controller.acquire("a", "interactive")
+        waiting = asyncio.create_task(controller.acquire("b", "interactive"))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        assert controller.stats() == {"running": 1, "queued": 1}
+        first.release()
+        second = await waiting
+        assert controller.stats() == {"running": 1, "queued": 0}
+        second.release()
+
+    run(scenario())
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, queue_size=1)
+        ticket = await controller.acquire("a", "interactive")
+        waiting = asyncio.create_task(controller.acquire("b", "interactive"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("c", "interactive")
+        assert rejected.value.reason == "queue_full"
+        assert rejected.value.retry_after >= 1
+        ticket.release()
+        (await waiting).release()
+
+    run(scenario())
+
+
+def test_queue_timeout_is_rejected_and_dequeued():
+    async def scenario():
+        controller = AdmissionController(
+            max_concurrency=1, queue_size=4, queue_timeout=0.01
+        )
+        ticket = await controller.acquire("a", "interactive")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("b", "interactive")
+        assert rejected.value.reason == "queue_timeout"
+        assert controller.stats() == {"running": 1, "queued": 0}
+        ticket.release()
+
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, queue_size=4)
+        ticket = await controller.acquire("a", "interactive")
+        waiting = asyncio.create_task(controller.acquire("b", "interactive"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        assert controller.stats() == {"running": 1, "queued": 0}
+        ticket.release()
+        assert controller.stats() == {"running": 0, "queued": 0}
+
+    run(scenario())
+
+
+def test_interactive_requests_are_served_before_batch():
+    async def scenario():
+        controller = AdmissionController(max_concurrency=1, queue_size=4)
+        ticket = await controller.acquire("a", "interactive")
+        batch = asyncio.create_task(controller.acquire("b", "batch"))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(controller.acquire("c", "interactive"))
+        await asyncio.sleep(0)
+        ticket.release()
+        served = await interactive
+        assert not batch.done()
+        assert controller.stats() == {"running": 1, "queued": 1}
+        served.release()
+        (await batch).release()
+
+    run(scenario())
+
+
+def test_per_identity_limit_does_not_hold_up_other_callers():
+    async def scenario():
+        controller = AdmissionController(
+            max_concurrency=4, max_concurrency_per_identity=1, queue_size=4
+        )
+        alice = await controller.acquire("alice", "interactive")
+        again = asyncio.create_task(controller.acquire("alice", "interactive"))
+        await asyncio.sleep(0)
+        assert not again.done()
+        bob = await controller.acquire("bob", "interactive")
+        alice.release()
+        (await again).release()
+        bob.release()
+
+    run(scenario())
+
+
+def test_per_identity_limits_do_not_apply_to_anonymous_callers():
+    async def scenario():
+        controller = AdmissionController(
+            max_concurrency=4,
+            max_concurrency_per_identity=1,
+            identity_queue_size=1,
+            queue_size=4,
+        )
+        tickets = [
+            await controller.acquire(ANONYMOUS_IDENTITY, "interactive")
+            for _ in range(3)
+        ]
+        assert controller.stats() == {"running": 3, "queued": 0}
+        for ticket in tickets:
+            ticket.release()
+
+    run(scenario())
+
+
+def test_identity_queue_limit():
+    async def scenario():
+        controller = AdmissionController(
+            max_concurrency=4,
+            max_concurrency_per_identity=1,
+            identity_queue_size=1,
+            queue_size=4,
+        )
+        ticket = await controller.acquire("alice", "interactive")
+        waiting = asyncio.create_task(controller.acquire("alice", "interactive"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("alice", "interactive")
+        assert rejected.value.reason == "identity_queue_full"
+        ticket.release()
+        (await waiting).release()
+
+    run(scenario())
+
+
+def test_rejected_request_gets_429_with_retry_after(monkeypatch):
+    import app as app_module
+
+    async def reject(identity, priority):
+        raise AdmissionRejected("queue_full", 7)
+
+    monkeypatch.setattr(app_module.admission_controller, "acquire", reject)
+
+    async def post():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await c.post(
+                "/chat/completions",
+                json={"messages": [{"role": "user", "content": "hi"}]},
+            )
+
+    response = run(post())
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "7"
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+import completion_cache
+import tool_cache
+from completion_cache import (
+    CompletionCache,
+    CompletionTranscript,
+    SqliteCompletionStore,
+)
+from tool_cache import ToolResultCache, Uncached, cached_tool
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(tool_cache.time, "monotonic", clock)
+    monkeypatch.setattr(completion_cache.time, "time", clock)
+    return clock
+
+
+def test_tool_result_is_fresh_then_stale_then_missing(clock):
+    cache = ToolResultCache()
+    key = ("lookup", ("q", "x"))
+    cache.store(key, "value")
+    assert cache.lookup(key, ttl=10, stale_ttl=5) == ("value", "fresh")
+    clock.now += 12
+    assert cache.lookup(key, ttl=10, stale_ttl=5) == ("value", "stale")
+    clock.now += 5
+    assert cache.lookup(key, ttl=10, stale_ttl=5) == (None, "miss")
+    assert cache.stats()["lookup"] == {
+        "hits": 1,
+        "misses": 1,
+        "stale_hits": 1,
+        "shared_hits": 0,
+        "refreshes": 0,
+    }
+
+
+def test_tool_results_are_evicted_least_recently_used_first(clock):
+    cache = ToolResultCache(max_entries=2)
+    cache.store(("t", 1), "one")
+    cache.store(("t", 2), "two")
+    cache.lookup(("t", 1), ttl=10, stale_ttl=0)
+    cache.store(("t", 3), "three")
+    assert cache.lookup(("t", 2), ttl=10, stale_ttl=0)[1] == "miss"
+    assert cache.lookup(("t", 1), ttl=10, stale_ttl=0)[1] == "fresh"
+    assert cache.lookup(("t", 3), ttl=10, stale_ttl=0)[1] == "fresh"
+
+
+def test_tool_results_are_bounded_by_size(clock):
+    cache = ToolResultCache(max_bytes=10)
+    cache.store(("t", 1), "x" * 11)
+    assert cache.lookup(("t", 1), ttl=10, stale_ttl=0)[1] == "miss"
+    cache.store(("t", 2), "x" * 6)
+    cache.store(("t", 3), "x" * 6)
+    assert cache.lookup(("t", 2), ttl=10, stale_ttl=0)[1] == "miss"
+    assert cache.lookup(("t", 3), ttl=10, stale_ttl=0)[1] == "fresh"
+
+
+def test_cached_tool_normalizes_arguments_and_skips_uncached(monkeypatch):
+    monkeypatch.setattr(tool_cache, "tool_cache", ToolResultCache())
+    calls = []
+
+    @cached_tool(ttl=60, name="test_lookup")
+    def lookup(query: str):
+        calls.append(query)
+        if query == "down":
+            return Uncached("fallback")
+        return f"result for {query}"
+
+    assert lookup("Hello  World") == "result for Hello  World"
+    assert lookup("hello world") == "result for Hello  World"
+    assert lookup("down") == "fallback"
+    assert lookup("down") == "fallback"
+    assert calls == ["Hello  World", "down", "down"]
+
+
+def test_async_cached_tool_shares_results(monkeypatch):
+    monkeypatch.setattr(tool_cache, "tool_cache", ToolResultCache())
+    calls = []
+
+    @cached_tool(ttl=60, name="test_async_lookup")
+    async def lookup(query: str):
+        calls.append(query)
+        return query.upper()
+
+    async def scenario():
+        return [await lookup("a"), await lookup(" A ")]
+
+    assert asyncio.run(scenario()) == ["A", "A"]
+    assert calls == ["a"]
+
+
+def test_completion_expires_after_ttl(clock):
+    cache = CompletionCache(ttl=60)
+    cache.put("key", CompletionTranscript("answer"))
+    assert cache.get("key").content == "answer"
+    clock.now += 61
+    assert cache.get("key") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 0}
+
+
+def test_completions_are_evicted_least_recently_used_first(clock):
+    cache = CompletionCache(max_entries=2)
+    cache.put("a", CompletionTranscript("a"))
+    cache.put("b", CompletionTranscript("b"))
+    cache.get("a")
+    cache.put("c", CompletionTranscript("c"))
+    assert cache.get("b") is None
+    assert cache.get("a").content == "a"
+    assert cache.get("c").content == "c"
+
+
+def test_completion_store_backs_the_memory_entries(tmp_path):
+    store = SqliteCompletionStore(str(tmp_path / "completions.sqlite"))
+    cache = CompletionCache(store=store)
+
+    async def scenario():
+        await cache.aput("key", CompletionTranscript("answer", [["content", "a"]]))
+        cache._entries.clear()
+        found = await cache.aget("key")
+        return found, len(cache._entries)
+
+    found, size = asyncio.run(scenario())
+    assert (found.content, found.events, size) == ("answer", [["content", "a"]], 1)
+    assert CompletionCache(store=store).get("key").content == "answer"
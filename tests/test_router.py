@@ -0,0 +1,141 @@
+import asyncio
+from typing import ClassVar, Type
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from benchmarks.stub_model import StubChatModel
+from llm_clients import register_provider
+from router import ModelRouter, RoutedChatModel, Target, is_failover_error, model_router
+
+
+class Unavailable(Exception):
+    status_code = 503
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+class UnavailableChatModel(StubChatModel):
+    error: ClassVar[Type[Exception]] = Unavailable
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise self.error()
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        raise self.error()
+        yield
+
+
+class RejectingChatModel(UnavailableChatModel):
+    error: ClassVar[Type[Exception]] = BadRequest
+
+
+def _provider(model_class):
+    return lambda model, overrides: model_class(
+        tokens=3, token_rate=1000.0, first_token_latency=0.0
+    )
+
+
+register_provider("test-up", _provider(StubChatModel))
+register_provider("test-down", _provider(UnavailableChatModel))
+register_provider("test-bad", _provider(RejectingChatModel))
+
+UP = Target("test-up/chat", None)
+DOWN = Target("test-down/chat", None)
+BAD = Target("test-bad/chat", None)
+
+
+@pytest.fixture(autouse=True)
+def reset_router():
+    model_router._stats.clear()
+    yield
+    model_router._stats.clear()
+
+
+def test_unmeasured_targets_go_first():
+    router = ModelRouter(groups={})
+    a, b = Target("a", None), Target("b", None)
+    router.record_success(a, "stream", 0.5)
+    assert router.order([a, b], "stream") == [b, a]
+
+
+def test_unmeasured_target_that_failed_goes_last():
+    router = ModelRouter(groups={}, failure_threshold=3)
+    a, b, c = Target("a", None), Target("b", None), Target("c", None)
+    router.record_success(a, "stream", 2.0)
+    router.record_failure(b)
+    assert router.order([b, c, a], "stream") == [c, a, b]
+
+
+def test_latency_is_kept_per_call_kind():
+    router = ModelRouter(groups={})
+    a, b = Target("a", None), Target("b", None)
+    router.record_success(a, "stream", 0.1)
+    router.record_success(a, "generate", 5.0)
+    router.record_success(b, "stream", 0.5)
+    router.record_success(b, "generate", 1.0)
+    assert router.order([a, b], "stream") == [a, b]
+    assert router.order([a, b], "generate") == [b, a]
+
+
+def test_error_rate_inflates_latency():
+    router = ModelRouter(groups={}, failure_threshold=10)
+    a, b = Target("a", None), Target("b", None)
+    for _ in range(5):
+        router.record_failure(a)
+    router.record_success(a, "generate", 1.0)
+    router.record_success(b, "generate", 1.5)
+    assert router.order([a, b], "generate") == [b, a]
+
+
+def test_open_circuit_sorts_after_healthy_targets():
+    router = ModelRouter(groups={}, failure_threshold=2, cooldown=60)
+    a, b = Target("a", None), Target("b", None)
+    router.record_success(a, "generate", 0.1)
+    router.record_success(b, "generate", 1.0)
+    router.record_failure(a)
+    assert router.order([a, b], "generate") == [a, b]
+    router.record_failure(a)
+    assert router.order([a, b], "generate") == [b, a]
+    router.record_success(a, "generate", 0.1)
+    assert router._stats[a].open_until == 0.0
+
+
+def test_failover_errors():
+    assert is_failover_error(asyncio.TimeoutError())
+    assert is_failover_error(ConnectionError())
+    assert is_failover_error(Unavailable())
+    assert not is_failover_error(BadRequest())
+    assert not is_failover_error(ValueError())
+
+
+def test_generate_fails_over_to_the_next_target():
+    routed = RoutedChatModel(route="test", targets=[DOWN, UP])
+    result = asyncio.run(routed.ainvoke([HumanMessage(content="hi")]))
+    assert result.content == "token0 token1 token2 "
+    assert model_router._stats[DOWN].failures == 1
+    assert model_router._stats[UP].latency.keys() == {"generate"}
+    # The failed target has no measurements, so it is now tried last.
+    assert model_router.order([DOWN, UP], "generate") == [UP, DOWN]
+
+
+def test_stream_fails_over_to_the_next_target():
+    routed = RoutedChatModel(route="test", targets=[DOWN, UP])
+
+    async def collect():
+        return [c.content async for c in routed.astream([HumanMessage(content="hi")])]
+
+    assert "".join(asyncio.run(collect())) == "token0 token1 token2 "
+    assert model_router._stats[DOWN].failures == 1
+    assert model_router._stats[UP].latency.keys() == {"stream"}
+
+
+def test_client_errors_neither_fail_over_nor_count_as_failures():
+    routed = RoutedChatModel(route="test", targets=[BAD, UP])
+    with pytest.raises(BadRequest):
+        asyncio.run(routed.ainvoke([HumanMessage(content="hi")]))
+    assert model_router._stats[BAD].failures == 0
+    assert model_router._stats[BAD].error_rate == 0.0
+    assert not model_router._stats[UP].latency
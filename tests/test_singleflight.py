@@ -0,0 +1,142 @@
+import asyncio
+
+from singleflight import SingleFlight
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_identical_calls_share_one_run():
+    async def scenario():
+        flight = SingleFlight()
+        runs = []
+
+        async def work():
+            runs.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        results = await asyncio.gather(*(flight.call("key", work) for _ in range(3)))
+        assert results == ["answer"] * 3
+        assert len(runs) == 1
+        # Finished flights are forgotten.
+        assert await flight.call("key", work) == "answer"
+        assert len(runs) == 2
+
+    run(scenario())
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        finished = asyncio.Event()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            finished.set()
+            return "answer"
+
+        leader = asyncio.create_task(flight.call("key", work))
+        follower = asyncio.create_task(flight.call("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "answer"
+        assert finished.is_set()
+        assert leader.cancelled()
+
+    run(scenario())
+
+
+def stream_run(started, cancelled, chunks=5):
+    def run_frames(encoder):
+        async def frames():
+            started.append(1)
+            try:
+                for index in range(chunks):
+                    await asyncio.sleep(0.005)
+                    yield encoder.content(f"chunk{index} ")
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+
+        return frames()
+
+    return run_frames
+
+
+def test_stream_subscribers_share_one_run_and_late_joiners_replay():
+    async def scenario():
+        flight = SingleFlight()
+        started, cancelled = [], []
+        run_frames = stream_run(started, cancelled)
+
+        async def collect(delay):
+            await asyncio.sleep(delay)
+            return [value async for _, value in flight.stream("key", run_frames)]
+
+        first, late = await asyncio.gather(collect(0), collect(0.012))
+        expected = [f"chunk{index} " for index in range(5)]
+        assert first == late == expected
+        assert started == [1] and not cancelled
+
+    run(scenario())
+
+
+def test_stream_is_cancelled_when_its_last_subscriber_leaves():
+    async def scenario():
+        flight = SingleFlight()
+        started, cancelled = [], []
+        run_frames = stream_run(started, cancelled, chunks=100)
+
+        async def read_one():
+            async for _ in flight.stream("key", run_frames):
+                return
+
+        await read_one()
+        await asyncio.sleep(0.01)
+        assert cancelled == [1]
+        assert not flight._streams
+
+    run(scenario())
+
+
+def test_stream_keeps_running_while_a_subscriber_remains():
+    async def scenario():
+        flight = SingleFlight()
+        started, cancelled = [], []
+        run_frames = stream_run(started, cancelled)
+
+        async def read_one():
+            async for _ in flight.stream("key", run_frames):
+                return
+
+        async def read_all():
+            return [value async for _, value in flight.stream("key", run_frames)]
+
+        _, everything = await asyncio.gather(read_one(), read_all())
+        assert len(everything) == 5
+        assert not cancelled
+
+    run(scenario())
+
+
+def test_stream_errors_reach_every_subscriber():
+    async def scenario():
+        flight = SingleFlight()
+
+        def failing(encoder):
+            async def frames():
+                yield encoder.content("partial ")
+                raise RuntimeError("upstream closed")
+
+            return frames()
+
+        async def collect():
+            return [event async for event in flight.stream("key", failing)]
+
+        first, second = await asyncio.gather(collect(), collect())
+        assert first == second
+        assert first[-1] == ("raw", "Error: upstream closed\n")
+
+    run(scenario())
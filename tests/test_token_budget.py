@@ -0,0 +1,99 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+import token_budget
+from token_budget import tokenizer, trim_history
+
+MODEL = "test-model"
+
+
+@pytest.fixture(autouse=True)
+def estimated_counts(monkeypatch):
+    # Four characters per token, without loading a tiktoken encoding.
+    monkeypatch.setattr(tokenizer, "encoding", lambda encoding_name: None)
+
+
+def budget(monkeypatch, tokens: int):
+    monkeypatch.setattr(token_budget, "HISTORY_TOKEN_BUDGET", tokens)
+
+
+def text(tokens: int) -> str:
+    return "word" * (tokens - token_budget.MESSAGE_OVERHEAD_TOKENS)
+
+
+def tool_call(call_id: str) -> AIMessage:
+    return AIMessage(
+        content="",
+        tool_calls=[{"name": "search", "args": {}, "id": call_id, "type": "tool_call"}],
+    )
+
+
+def test_history_within_budget_is_unchanged(monkeypatch):
+    budget(monkeypatch, 1000)
+    messages = [SystemMessage(content="system"), HumanMessage(content="hi")]
+    trimmed, dropped = trim_history(messages, MODEL)
+    assert trimmed == messages and trimmed is not messages
+    assert dropped == 0
+
+
+def test_oldest_turns_are_dropped_and_system_messages_kept(monkeypatch):
+    budget(monkeypatch, 40)
+    messages = [
+        SystemMessage(content=text(10)),
+        HumanMessage(content=text(10)),
+        AIMessage(content=text(10)),
+        HumanMessage(content=text(10)),
+        AIMessage(content=text(10)),
+        HumanMessage(content=text(10)),
+    ]
+    trimmed, dropped = trim_history(messages, MODEL)
+    assert trimmed == [messages[0]] + messages[3:]
+    assert dropped == 20
+
+
+def test_tool_calls_are_dropped_with_their_responses(monkeypatch):
+    budget(monkeypatch, 30)
+    messages = [
+        HumanMessage(content=text(10)),
+        tool_call("a"),
+        ToolMessage(content=text(10), tool_call_id="a"),
+        AIMessage(content=text(10)),
+        HumanMessage(content=text(10)),
+    ]
+    trimmed, _ = trim_history(messages, MODEL)
+    assert trimmed == messages[3:]
+    assert not any(isinstance(m, ToolMessage) for m in trimmed)
+
+
+def test_tool_calls_are_kept_with_responses_appended_later(monkeypatch):
+    # Placeholder responses for unanswered calls are appended at the end.
+    budget(monkeypatch, 30)
+    messages = [
+        HumanMessage(content=text(10)),
+        HumanMessage(content=text(10)),
+        tool_call("a"),
+        ToolMessage(content=text(10), tool_call_id="a"),
+    ]
+    trimmed, _ = trim_history(messages, MODEL)
+    assert trimmed == messages[1:]
+    messages = [
+        HumanMessage(content=text(10)),
+        tool_call("a"),
+        HumanMessage(content=text(10)),
+        ToolMessage(content=text(10), tool_call_id="a"),
+    ]
+    trimmed, _ = trim_history(messages, MODEL)
+    assert trimmed == messages[1:]
+    budget(monkeypatch, 20)
+    trimmed, _ = trim_history(messages, MODEL)
+    assert trimmed == messages[2:3]
+
+
+def test_newest_turn_over_budget_is_truncated(monkeypatch):
+    budget(monkeypatch, 20)
+    messages = [HumanMessage(content=text(10)), HumanMessage(content=text(50))]
+    trimmed, dropped = trim_history(messages, MODEL)
+    assert len(trimmed) == 1
+    assert trimmed[0].content == messages[1].content[: 16 * 4]
+    assert messages[1].content == text(50)
+    assert dropped == 60 - 20
@@ -0,0 +1,236 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage, ToolMessage
+
+from config import HISTORY_TOKEN_BUDGET, HISTORY_TOKEN_BUDGETS, MODEL_GROUPS
+from models import MODEL_TOKEN_BUDGETS
+
+logger = logging.getLogger()
+
+# Per-message framing of the chat format (role and separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+# Estimate used when no tokenizer can be loaded.
+CHARS_PER_TOKEN = 4
+# Open models have no local tokenizer here; o200k is a close enough proxy.
+DEFAULT_ENCODING = "o200k_base"
+# Seconds before retrying an encoding that failed to load; doubles per failure.
+RETRY_BACKOFF = 30.0
+MAX_RETRY_BACKOFF = 600.0
+
+
+class Tokenizer:
+    """Counts tokens with tiktoken, memoizing counts per text.
+
+    Encodings are loaded with ``load`` during startup, or in a background
+    thread on first use, as tiktoken may fetch their ranks over the network.
+    Until an encoding is loaded, and for a backoff after it fails to load
+    (tiktoken missing, or no network), lengths are estimated at
+    ``CHARS_PER_TOKEN`` characters per token instead.
+    """
+
+    def __init__(self, max_entries: int = 8192):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._encodings: Dict[str, Any] = {}
+        self._loading = set()
+        # Encoding name -> (monotonic time of the next attempt, backoff).
+        self._retry: Dict[str, Tuple[float, float]] = {}
+        self._counts: "OrderedDict[Tuple, int]" = OrderedDict()
+
+    def encoding_name(self, model: Any) -> str:
+        name = getattr(model, "value", model)
+        if "gpt" in name:
+            try:
+                import tiktoken
+
+                return tiktoken.encoding_name_for_model(name)
+            except Exception:
+                pass
+        return DEFAULT_ENCODING
+
+    def load(self, encoding_name: str):
+        """Loads an encoding in the calling thread; returns None on failure."""
+        try:
+            import tiktoken
+
+            encoding = tiktoken.get_encoding(encoding_name)
+        except Exception as e:
+            with self._lock:
+                self._loading.discard(encoding_name)
+                previous = self._retry.get(encoding_name)
+                backoff = RETRY_BACKOFF
+                if previous is not None:
+                    backoff = min(previous[1] * 2, MAX_RETRY_BACKOFF)
+                self._retry[encoding_name] = (time.monotonic() + backoff, backoff)
+            logger.warning(
+                "Tokenizer %s unavailable, estimating token counts for %.0fs: %s",
+                encoding_name,
+                backoff,
+                e,
+            )
+            return None
+        with self._lock:
+            self._loading.discard(encoding_name)
+            self._retry.pop(encoding_name, None)
+            self._encodings[encoding_name] = encoding
+        return encoding
+
+    def encoding(self, encoding_name: str):
+        """Returns the encoding, or None while it is being loaded in the
+        background or is waiting out the backoff after a failed load."""
+        with self._lock:
+            encoding = self._encodings.get(encoding_name)
+            if encoding is not None or encoding_name in self._loading:
+                return encoding
+            retry = self._retry.get(encoding_name)
+            if retry is not None and time.monotonic() < retry[0]:
+                return None
+            self._loading.add(encoding_name)
+        threading.Thread(
+            target=self.load,
+            args=(encoding_name,),
+            name=f"tokenizer-{encoding_name}",
+            daemon=True,
+        ).start()
+        return None
+
+    def count(self, text: str, encoding_name: str) -> int:
+        if not text:
+            return 0
+        # Keyed by hash so long texts are not kept alive by the cache.
+        key = (encoding_name, len(text), hash(text))
+        with self._lock:
+            count = self._counts.get(key)
+            if count is not None:
+                self._counts.move_to_end(key)
+                return count
+        encoding = self.encoding(encoding_name)
+        if encoding is None:
+            # Estimates are not cached so exact counts replace them once
+            # the encoding has loaded.
+            return -(-len(text) // CHARS_PER_TOKEN)
+        count = len(encoding.encode(text, disallowed_special=()))
+        with self._lock:
+            self._counts[key] = count
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return count
+
+    def truncate(self, text: str, max_tokens: int, encoding_name: str) -> str:
+        encoding = self.encoding(encoding_name)
+        if encoding is None:
+            return text[: max_tokens * CHARS_PER_TOKEN]
+        return encoding.decode(
+            encoding.encode(text, disallowed_special=())[:max_tokens]
+        )
+
+
+tokenizer = Tokenizer()
+
+
+def _text_of(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    parts = []
+    for part in content or []:
+        if isinstance(part, str):
+            parts.append(part)
+        elif isinstance(part, dict) and part.get("type") == "text":
+            parts.append(part.get("text", ""))
+    return "".join(parts)
+
+
+def message_tokens(message: BaseMessage, encoding_name: str) -> int:
+    tokens = MESSAGE_OVERHEAD_TOKENS + tokenizer.count(
+        _text_of(message.content), encoding_name
+    )
+    for call in getattr(message, "tool_calls", None) or []:
+        tokens += tokenizer.count(call["name"], encoding_name)
+        tokens += tokenizer.count(json.dumps(call["args"]), encoding_name)
+    return tokens
+
+
+def token_budget(model: Any) -> int:
+    name = getattr(model, "value", model)
+    if name in HISTORY_TOKEN_BUDGETS:
+        return HISTORY_TOKEN_BUDGETS[name]
+    return MODEL_TOKEN_BUDGETS.get(name, HISTORY_TOKEN_BUDGET)
+
+
+def _turn_units(messages: List[BaseMessage]) -> List[List[int]]:
+    """Groups message indexes so tool calls stay with their tool responses.
+
+    Placeholder responses from ``message_conversion.convert_messages`` are
+    appended at the end of the history, so responses are matched by
+    tool_call_id rather than by position.
+    """
+    units: List[List[int]] = []
+    unit_of_call: Dict[str, int] = {}
+    for index, message in enumerate(messages):
+        if isinstance(message, SystemMessage):
+            continue
+        if isinstance(message, ToolMessage) and message.tool_call_id in unit_of_call:
+            units[unit_of_call[message.tool_call_id]].append(index)
+            continue
+        units.append([index])
+        if isinstance(message, AIMessage):
+            for call in message.tool_calls:
+                unit_of_call[call["id"]] = len(units) - 1
+    return units
+
+
+def trim_history(
+    messages: List[BaseMessage], model: Any, reserved_text: str = ""
+) -> Tuple[List[BaseMessage], int]:
+    """Drops the oldest turns until the history fits the model's token budget.
+
+    System messages are always kept, as is the newest turn; if that alone is
+    over budget its text is cut to fit. Tool calls are kept or dropped
+    together with their responses. ``reserved_text`` (e.g. the agent prompt)
+    is counted against the budget. Returns a new list and the number of
+    tokens dropped; the input messages are not modified.
+    """
+    encoding_name = tokenizer.encoding_name(model)
+    budget = token_budget(model) - tokenizer.count(reserved_text, encoding_name)
+    counts = [message_tokens(m, encoding_name) for m in messages]
+    total = sum(counts)
+    if total <= budget:
+        return list(messages), 0
+    keep = {i for i, m in enumerate(messages) if isinstance(m, SystemMessage)}
+    used = sum(counts[i] for i in keep)
+    replacements: Dict[int, BaseMessage] = {}
+    units = _turn_units(messages)
+    for position, unit in enumerate(reversed(units)):
+        unit_tokens = sum(counts[i] for i in unit)
+        if used + unit_tokens <= budget:
+            keep.update(unit)
+            used += unit_tokens
+            continue
+        if position == 0:
+            keep.update(unit)
+            if len(unit) == 1 and isinstance(messages[unit[0]].content, str):
+                message = messages[unit[0]]
+                room = max(budget - used - MESSAGE_OVERHEAD_TOKENS, 0)
+                text = tokenizer.truncate(message.content, room, encoding_name)
+                replacements[unit[0]] = message.model_copy(update={"content": text})
+                used += message_tokens(replacements[unit[0]], encoding_name)
+            else:
+                used += unit_tokens
+        break
+    trimmed = [replacements.get(i, m) for i, m in enumerate(messages) if i in keep]
+    return trimmed, max(total - used, 0)
+
+
+def preload_tokenizers(model: Any):
+    """Loads the encodings of ``model`` and of every model with a token
+    budget or in a model group, so requests do not wait for them."""
+    models = [model, *MODEL_TOKEN_BUDGETS, *HISTORY_TOKEN_BUDGETS]
+    for group in MODEL_GROUPS.values():
+        models.extend(group)
+    for encoding_name in sorted({tokenizer.encoding_name(m) for m in models}):
+        tokenizer.load(encoding_name)
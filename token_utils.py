@@ -1,36 +1,172 @@
-import json
-import os
+import asyncio
+import hashlib
+import logging
+import threading
 import time
+from typing import Dict, Optional
 
 import requests
 
+from config import IAM_REQUEST_TIMEOUT, IAM_TOKEN_REFRESH_MARGIN, WATSONX_API_KEY
+from shared_store import get_shared_store
+
+logger = logging.getLogger()
+
+IAM_URL = "https://iam.cloud.ibm.com/identity/token"
+DEFAULT_TOKEN_LIFETIME = 3600
+
+
+class IAMTokenManager:
+    """Keeps an IBM Cloud IAM token in memory and refreshes it ahead of expiry.
+
+    Refreshes are single-flight: sync callers serialize on a lock and async
+    callers await one shared task, so an expired token causes exactly one IAM
+    request. ``start_background_refresh`` keeps the token fresh so request
+    handlers only ever read it from memory.
+
+    With a shared store configured, worker processes on the host share the
+    token: a refresh takes a host-wide lock and first checks whether another
+    process has already stored a fresh token, so one IAM request serves
+    every worker.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        url: str = IAM_URL,
+        refresh_margin: float = IAM_TOKEN_REFRESH_MARGIN,
+        timeout: float = IAM_REQUEST_TIMEOUT,
+    ):
+        self.api_key = api_key
+        self.url = url
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._background_task: Optional[asyncio.Task] = None
+        # Names the key in the shared store without revealing it.
+        self._key_id = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+    def _is_valid(self, margin: float = 0.0) -> bool:
+        return self._token is not None and time.time() < self._expires_at - margin
+
+    def _request_token(self) -> Dict:
+        headers = {
+            "content-type": "application/x-www-form-urlencoded",
+            "accept": "application/json",
+        }
+        data = {
+            "grant_type": "urn:ibm:params:oauth:grant-type:apikey",
+            "apikey": self.api_key,
+        }
+        response = self._session.post(
+            self.url, headers=headers, data=data, timeout=self.timeout
+        )
+        if response.status_code != 200:
+            raise Exception("Failed to get access token")
+        return response.json()
+
+    def _store(self, token_data: Dict):
+        now = time.time()
+        if token_data.get("expiration"):
+            expires_at = float(token_data["expiration"])
+        elif token_data.get("expires_in"):
+            expires_at = now + float(token_data["expires_in"])
+        else:
+            expires_at = now + DEFAULT_TOKEN_LIFETIME
+        self._token = token_data["access_token"]
+        self._expires_at = expires_at
+        logger.info("Retrieved new IAM token, expires in %ds", int(expires_at - now))
+
+    def _refresh(self, margin: float) -> str:
+        with self._lock:
+            # Another caller may have refreshed while we waited for the lock.
+            if self._is_valid(margin):
+                return self._token
+            shared = get_shared_store()
+            if shared is None:
+                self._store(self._request_token())
+                return self._token
+            with shared.lock(f"iam-{self._key_id}"):
+                entry = shared.get("iam", self._key_id)
+                if entry is not None and time.time() < entry[1] - margin:
+                    self._token, self._expires_at = entry
+                else:
+                    self._store(self._request_token())
+                    shared.set("iam", self._key_id, self._token, self._expires_at)
+            return self._token
+
+    def get_token(self) -> str:
+        if self._is_valid():
+            return self._token
+        return self._refresh(0.0)
+
+    async def aget_token(self) -> str:
+        if self._is_valid(self.refresh_margin):
+            return self._token
+        task = self._ensure_refresh()
+        if self._is_valid():
+            # Still usable: serve it now and let the refresh finish in the background.
+            return self._token
+        return await asyncio.shield(task)
+
+    def _ensure_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(
+                asyncio.to_thread(self._refresh, self.refresh_margin)
+            )
+            self._refresh_task.add_done_callback(self._log_refresh_error)
+        return self._refresh_task
+
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("IAM token refresh failed: %s", task.exception())
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                if not self._is_valid(self.refresh_margin):
+                    await asyncio.shield(self._ensure_refresh())
+                delay = self._expires_at - self.refresh_margin - time.time()
+            except Exception:
+                delay = 10
+            await asyncio.sleep(max(delay, 1))
+
+    def start_background_refresh(self):
+        if self._background_task is None or self._background_task.done():
+            self._background_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop_background_refresh(self):
+        if self._background_task is not None:
+            self._background_task.cancel()
+            try:
+                await self._background_task
+            except asyncio.CancelledError:
+                pass
+            self._background_task = None
+
+
+_managers: Dict[str, IAMTokenManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_token_manager(api_key: str = WATSONX_API_KEY) -> IAMTokenManager:
+    if not api_key:
+        raise ValueError("Failed to get access token: WATSONX_API_KEY is not set")
+    manager = _managers.get(api_key)
+    if manager is None:
+        with _managers_lock:
+            manager = _managers.setdefault(api_key, IAMTokenManager(api_key))
+    return manager
+
 
 def get_access_token(WATSONX_API_KEY):
-    api_key = WATSONX_API_KEY
-    file_path = "./current_token.txt"
-    url = "https://iam.cloud.ibm.com/identity/token"
-    headers = {
-        "content-type": "application/x-www-form-urlencoded",
-        "accept": "application/json",
-    }
-    data = {"grant_type": "urn:ibm:params:oauth:grant-type:apikey", "apikey": api_key}
-
-    if os.path.isfile(file_path):
-        file_time = os.path.getmtime(file_path)
-        if time.time() - file_time < 3600:
-            print("Retrieved cached token ")
-            with open(file_path, "r") as file:
-                return file.read()
-
-    response = requests.post(url, headers=headers, data=data)
-
-    if response.status_code == 200:
-        token_data = json.loads(response.text)
-        token = token_data["access_token"]
-
-        with open(file_path, "w") as file:
-            file.write(token)
-        print("Retrieved new token for ")
-        return token
-    else:
-        raise Exception("Failed to get access token")
+    return get_token_manager(WATSONX_API_KEY).get_token()
+
+
+async def aget_access_token(WATSONX_API_KEY):
+    return await get_token_manager(WATSONX_API_KEY).aget_token()
@@ -0,0 +1,303 @@
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from config import TOOL_CACHE_ENABLED, TOOL_CACHE_MAX_BYTES, TOOL_CACHE_MAX_ENTRIES
+from shared_store import get_shared_store
+
+logger = logging.getLogger()
+
+
+def normalize_argument(value: Any) -> Hashable:
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    if isinstance(value, dict):
+        return tuple(sorted((k, normalize_argument(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_argument(v) for v in value)
+    return value
+
+
+class Uncached:
+    """Wraps a tool result that must not be cached, e.g. a fallback returned
+    when the upstream call failed. ``cached_tool`` returns the bare value."""
+
+    def __init__(self, value: Any):
+        self.value = value
+
+
+def _unwrap(value: Any) -> Tuple[Any, bool]:
+    if isinstance(value, Uncached):
+        return value.value, False
+    return value, True
+
+
+def _size_of(value: Any) -> int:
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return len(repr(value))
+
+
+class ToolResultCache:
+    """Bounded LRU of tool results with per-entry TTL.
+
+    Entries past their TTL but inside the stale window are still served while
+    a single background call refreshes them (stale-while-revalidate).
+
+    An optional ``store`` (a ``shared_store.SharedNamespace``) shares
+    JSON-serializable results with the other workers on the host; local
+    misses fall through to it ("shared_hits") and its entries are copied
+    into memory with their original age. ``alookup`` and ``astore`` do the
+    shared store's blocking I/O in a worker thread.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = TOOL_CACHE_MAX_ENTRIES,
+        max_bytes: int = TOOL_CACHE_MAX_BYTES,
+        store=None,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared = store
+        self.metrics: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {
+                "hits": 0,
+                "misses": 0,
+                "stale_hits": 0,
+                "shared_hits": 0,
+                "refreshes": 0,
+            }
+        )
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._refreshing = set()
+
+    def lookup(self, key: Tuple, ttl: float, stale_ttl: float):
+        """Returns (value, state) where state is "fresh", "stale" or "miss"."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None or self.shared is None:
+                return self._classify(key, entry, ttl, stale_ttl, "hits")
+        entry = self._load_shared(key)
+        with self._lock:
+            return self._classify(key, entry, ttl, stale_ttl, "shared_hits")
+
+    async def alookup(self, key: Tuple, ttl: float, stale_ttl: float):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None or self.shared is None:
+                return self._classify(key, entry, ttl, stale_ttl, "hits")
+        entry = await asyncio.to_thread(self._load_shared, key)
+        with self._lock:
+            return self._classify(key, entry, ttl, stale_ttl, "shared_hits")
+
+    def _classify(self, key: Tuple, entry, ttl: float, stale_ttl: float, hit: str):
+        if entry is None:
+            self.metrics[key[0]]["misses"] += 1
+            return None, "miss"
+        value, stored_at, _ = entry
+        age = time.monotonic() - stored_at
+        current = self._entries.get(key) is entry
+        if age < ttl + stale_ttl:
+            if current:
+                self._entries.move_to_end(key)
+            fresh = age < ttl
+            self.metrics[key[0]][hit if fresh else "stale_hits"] += 1
+            return value, "fresh" if fresh else "stale"
+        if current:
+            self._remove(key)
+        self.metrics[key[0]]["misses"] += 1
+        return None, "miss"
+
+    def _load_shared(self, key: Tuple) -> Optional[Tuple[Any, float, int]]:
+        try:
+            found = self.shared.get(repr(key))
+        except Exception as e:
+            logger.warning("Could not read shared tool result: %s", e)
+            return None
+        if found is None:
+            return None
+        entry = json.loads(found[0])
+        age = max(time.time() - entry["stored_at"], 0.0)
+        stored_at = time.monotonic() - age
+        value = entry["value"]
+        loaded = (value, stored_at, _size_of(value))
+        with self._lock:
+            if key not in self._entries and loaded[2] <= self.max_bytes:
+                self._insert(key, *loaded)
+                return self._entries[key]
+        return loaded
+
+    def store(self, key: Tuple, value: Any, max_age: float = 0.0):
+        """Caches ``value``; ``max_age`` (TTL plus stale window) bounds how
+        long the shared store keeps it."""
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        if self.shared is not None and max_age:
+            self._store_shared(key, value, max_age)
+        with self._lock:
+            self._insert(key, value, time.monotonic(), size)
+
+    async def astore(self, key: Tuple, value: Any, max_age: float = 0.0):
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._insert(key, value, time.monotonic(), size)
+        if self.shared is not None and max_age:
+            await asyncio.to_thread(self._store_shared, key, value, max_age)
+
+    def _store_shared(self, key: Tuple, value: Any, max_age: float):
+        now = time.time()
+        try:
+            payload = json.dumps({"value": value, "stored_at": now})
+        except TypeError:
+            return
+        try:
+            self.shared.set(repr(key), payload, now + max_age)
+        except Exception as e:
+            logger.warning("Could not share tool result: %s", e)
+
+    def _insert(self, key: Tuple, value: Any, stored_at: float, size: int):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, stored_at, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def start_refresh(self, key: Tuple) -> bool:
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.metrics[key[0]]["refreshes"] += 1
+            return True
+
+    def finish_refresh(self, key: Tuple):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def _remove(self, key: Tuple):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: dict(counts) for name, counts in self.metrics.items()}
+
+
+def _shared_namespace():
+    store = get_shared_store()
+    return store.namespace("tool") if store is not None else None
+
+
+tool_cache = ToolResultCache(store=_shared_namespace())
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tool-cache")
+# The event loop only keeps weak references to tasks, so background
+# refreshes are held here until they finish.
+_refresh_tasks = set()
+
+
+def cached_tool(
+    ttl: float, stale_ttl: Optional[float] = None, name: Optional[str] = None
+):
+    """Caches a tool function's results; apply it underneath ``@tool``.
+
+    Works for both sync and async functions. Keys are built from ``name``
+    (defaulting to the function name) and the bound, normalized arguments, so
+    trivially different spellings of the same lookup share a cache entry and
+    a tool's sync and async implementations can share results. Results
+    wrapped in ``Uncached`` are returned unwrapped and not stored.
+    """
+    if stale_ttl is None:
+        stale_ttl = ttl
+
+    def decorator(func: Callable):
+        signature = inspect.signature(func)
+        cache_name = name or func.__name__
+
+        def make_key(args, kwargs) -> Tuple:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return (cache_name,) + tuple(
+                (arg, normalize_argument(value))
+                for arg, value in bound.arguments.items()
+            )
+
+        def store(key, value) -> Any:
+            value, cacheable = _unwrap(value)
+            if cacheable:
+                tool_cache.store(key, value, ttl + stale_ttl)
+            return value
+
+        async def astore(key, value) -> Any:
+            value, cacheable = _unwrap(value)
+            if cacheable:
+                await tool_cache.astore(key, value, ttl + stale_ttl)
+            return value
+
+        def refresh_sync(key, args, kwargs):
+            try:
+                store(key, func(*args, **kwargs))
+            except Exception as e:
+                logger.warning("Background refresh of %s failed: %s", cache_name, e)
+            finally:
+                tool_cache.finish_refresh(key)
+
+        async def refresh_async(key, args, kwargs):
+            try:
+                await astore(key, await func(*args, **kwargs))
+            except Exception as e:
+                logger.warning("Background refresh of %s failed: %s", cache_name, e)
+            finally:
+                tool_cache.finish_refresh(key)
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not TOOL_CACHE_ENABLED:
+                    return _unwrap(await func(*args, **kwargs))[0]
+                key = make_key(args, kwargs)
+                value, state = await tool_cache.alookup(key, ttl, stale_ttl)
+                if state == "stale" and tool_cache.start_refresh(key):
+                    task = asyncio.create_task(refresh_async(key, args, kwargs))
+                    _refresh_tasks.add(task)
+                    task.add_done_callback(_refresh_tasks.discard)
+                if state != "miss":
+                    return value
+                return await astore(key, await func(*args, **kwargs))
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TOOL_CACHE_ENABLED:
+                return _unwrap(func(*args, **kwargs))[0]
+            key = make_key(args, kwargs)
+            value, state = tool_cache.lookup(key, ttl, stale_ttl)
+            if state == "stale" and tool_cache.start_refresh(key):
+                _refresh_executor.submit(refresh_sync, key, args, kwargs)
+            if state != "miss":
+                return value
+            return store(key, func(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from typing import TYPE_CHECKING, Dict, Sequence
+
+from config import TOOL_CONCURRENCY_LIMITS, TOOL_MAX_CONCURRENCY
+
+if TYPE_CHECKING:
+    from langgraph.prebuilt import ToolNode
+
+
+class ToolConcurrencyLimiter:
+    """Caps how many calls of each tool run at once across all agent runs.
+
+    The agent already executes the tool calls of one model turn concurrently
+    and merges their results in call order; this only bounds the fan-out per
+    tool so a burst of searches cannot overrun an upstream.
+    """
+
+    def __init__(
+        self,
+        default_limit: int = TOOL_MAX_CONCURRENCY,
+        limits: Dict[str, int] = TOOL_CONCURRENCY_LIMITS,
+    ):
+        self.default_limit = default_limit
+        self.limits = limits
+        self._lock = threading.Lock()
+        self._semaphores: Dict[str, threading.BoundedSemaphore] = {}
+        self._async_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def limit_for(self, tool_name: str) -> int:
+        return self.limits.get(tool_name, self.default_limit)
+
+    def _semaphore(self, tool_name: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if tool_name not in self._semaphores:
+                self._semaphores[tool_name] = threading.BoundedSemaphore(
+                    self.limit_for(tool_name)
+                )
+            return self._semaphores[tool_name]
+
+    def _async_semaphore(self, tool_name: str) -> asyncio.Semaphore:
+        with self._lock:
+            if tool_name not in self._async_semaphores:
+                self._async_semaphores[tool_name] = asyncio.Semaphore(
+                    self.limit_for(tool_name)
+                )
+            return self._async_semaphores[tool_name]
+
+    def wrap(self, request, execute):
+        with self._semaphore(request.tool_call["name"]):
+            return execute(request)
+
+    async def awrap(self, request, execute):
+        async with self._async_semaphore(request.tool_call["name"]):
+            return await execute(request)
+
+
+tool_limiter = ToolConcurrencyLimiter()
+
+
+def build_tool_node(tools: Sequence) -> "ToolNode":
+    # langgraph.prebuilt is slow to import and only needed once a graph is
+    # compiled, see graph_cache.
+    from langgraph.prebuilt import ToolNode
+
+    return ToolNode(
+        list(tools),
+        wrap_tool_call=tool_limiter.wrap,
+        awrap_tool_call=tool_limiter.awrap,
+    )
@@ -1,14 +1,96 @@
+import asyncio
+import importlib
 import json
+from concurrent.futures import ThreadPoolExecutor
 
-import requests
-from langchain_community.tools import DuckDuckGoSearchResults
 from langchain_core.tools import tool
-from tavily import TavilyClient
 
-from config import ALPHAVANTAGE_API_KEY, TAVILY_API_KEY
+from config import ALPHAVANTAGE_API_KEY, HTTP_POOL_SIZE, TAVILY_API_KEY
+from http_clients import (
+    get_async_client,
+    get_session,
+    tool_httpx_timeout,
+    tool_timeout,
+)
+from tool_cache import Uncached, cached_tool
+
+# DuckDuckGo has no async client and no timeout setting, so searches run on a
+# dedicated pool and callers stop waiting after the tool's read timeout.
+_duckduckgo_executor = ThreadPoolExecutor(
+    max_workers=HTTP_POOL_SIZE, thread_name_prefix="duckduckgo"
+)
+_duckduckgo_searches = {}
+# Tavily sets its API key as a default header of the session or client it
+# is given, so it gets pools of its own. Its clients are kept as (pooled
+# session or client, Tavily client) and rebuilt when the pool is replaced.
+TAVILY_POOL = "tavily"
+_tavily_client = None
+_async_tavily_client = None
+
+
+def async_implementation(sync_tool):
+    """Registers the decorated coroutine as the ``ainvoke`` path of a tool."""
+
+    def register(coroutine):
+        sync_tool.coroutine = coroutine
+        return coroutine
+
+    return register
+
+
+def _get_duckduckgo(backend: str):
+    search = _duckduckgo_searches.get(backend)
+    if search is None:
+        from langchain_community.tools import DuckDuckGoSearchResults
+
+        search = _duckduckgo_searches.setdefault(
+            backend, DuckDuckGoSearchResults(backend=backend)
+        )
+    return search
+
+
+def _run_duckduckgo(backend: str, tool_name: str, search_phrase: str):
+    search = _get_duckduckgo(backend)
+    future = _duckduckgo_executor.submit(search.run, search_phrase)
+    return future.result(timeout=tool_timeout(tool_name)[1])
+
+
+async def _arun_duckduckgo(backend: str, tool_name: str, search_phrase: str):
+    search = _get_duckduckgo(backend)
+    future = _duckduckgo_executor.submit(search.run, search_phrase)
+    return await asyncio.wait_for(
+        asyncio.wrap_future(future), timeout=tool_timeout(tool_name)[1]
+    )
+
+
+def _get_tavily_client():
+    global _tavily_client
+    session = get_session(TAVILY_POOL)
+    if _tavily_client is None or _tavily_client[0] is not session:
+        from tavily import TavilyClient
+
+        _tavily_client = (
+            session,
+            TavilyClient(api_key=TAVILY_API_KEY, session=session),
+        )
+    return _tavily_client[1]
+
+
+def _get_async_tavily_client():
+    global _async_tavily_client
+    client = get_async_client(TAVILY_POOL)
+    if _async_tavily_client is None or _async_tavily_client[0] is not client:
+        from tavily import AsyncTavilyClient
+
+        _async_tavily_client = (
+            client,
+            AsyncTavilyClient(api_key=TAVILY_API_KEY, client=client),
+        )
+    return _async_tavily_client[1]
 
 
 @tool
+@cached_tool(ttl=600)
 def web_search_duckduckgo(search_phrase: str):
     """
     Perform a general web search using DuckDuckGo.
@@ -27,12 +109,17 @@ def web_search_duckduckgo(search_phrase: str):
         - Research and fact-checking
         - Retrieving website links about any topic
     """
-    search = DuckDuckGoSearchResults()
-    results = search.run(search_phrase)
-    return results
+    return _run_duckduckgo("text", "web_search_duckduckgo", search_phrase)
+
+
+@async_implementation(web_search_duckduckgo)
+@cached_tool(ttl=600, name="web_search_duckduckgo")
+async def aweb_search_duckduckgo(search_phrase: str):
+    return await _arun_duckduckgo("text", "web_search_duckduckgo", search_phrase)
 
 
 @tool
+@cached_tool(ttl=180)
 def news_search_duckduckgo(search_phrase: str):
     """
     Search for recent news articles using DuckDuckGo's news backend.
@@ -51,12 +138,17 @@ def news_search_duckduckgo(search_phrase: str):
         - Monitoring news coverage
         - Finding recent developments about people, places, or organizations
     """
-    search = DuckDuckGoSearchResults(backend="news")
-    results = search.run(search_phrase)
-    return results
+    return _run_duckduckgo("news", "news_search_duckduckgo", search_phrase)
+
+
+@async_implementation(news_search_duckduckgo)
+@cached_tool(ttl=180, name="news_search_duckduckgo")
+async def anews_search_duckduckgo(search_phrase: str):
+    return await _arun_duckduckgo("news", "news_search_duckduckgo", search_phrase)
 
 
 @tool
+@cached_tool(ttl=600)
 def tavily_search(search_phrase: str):
     """
     Search the web using Tavily's intelligent web search API.
@@ -72,13 +164,51 @@ def tavily_search(search_phrase: str):
         - Providing citations and context
         - Retrieving longer-form summaries from trusted sources
     """
-    tavily_client = TavilyClient(api_key=TAVILY_API_KEY)
-    response = tavily_client.search(search_phrase, time_range="month", max_results=13)
+    response = _get_tavily_client().search(
+        search_phrase,
+        time_range="month",
+        max_results=13,
+        timeout=tool_timeout("tavily_search")[1],
+    )
     response = json.dumps(response, ensure_ascii=False)
     return response
 
 
+@async_implementation(tavily_search)
+@cached_tool(ttl=600, name="tavily_search")
+async def atavily_search(search_phrase: str):
+    response = await _get_async_tavily_client().search(
+        search_phrase,
+        time_range="month",
+        max_results=13,
+        timeout=tool_timeout("tavily_search")[1],
+    )
+    return json.dumps(response, ensure_ascii=False)
+
+
+FALLBACK_EXCHANGE_RATE = {
+    "2. From_Currency Name": "United States Dollar",
+    "4. To_Currency Name": "South Korean Won",
+    "5. Exchange Rate": "1366.77000000",
+    "6. Last Refreshed": "2025-07-07 11:23:32",
+}
+
+
+def _currency_exchange_url():
+    from_currency = "USD"
+    to_currency = "KRW"
+    return f"https://www.alphavantage.co/query?function=CURRENCY_EXCHANGE_RATE&from_currency={from_currency}&to_currency={to_currency}&apikey={ALPHAVANTAGE_API_KEY}"
+
+
+def _format_exchange_rate(data):
+    to_return = f"""
+    The exchange rate from {data["2. From_Currency Name"]} to {data["4. To_Currency Name"]} is {data["5. Exchange Rate"]} as of {data["6. Last Refreshed"]}.
+    """
+    return to_return.strip()
+
+
 @tool
+@cached_tool(ttl=60)
 def get_currency_exchange(src_currency: str, tgt_currency: str):
     """Performs a currency exchange rate lookup using the Alpha Vantage API.
     It changes the currency from USD to KRW.
@@ -86,25 +216,45 @@ def get_currency_exchange(src_currency: str, tgt_currency: str):
     Returns:
         A string containing the exchange rate.
     """
-    from_currency = "USD"
-    to_currency = "KRW"
-    request_url = f"https://www.alphavantage.co/query?function=CURRENCY_EXCHANGE_RATE&from_currency={from_currency}&to_currency={to_currency}&apikey={ALPHAVANTAGE_API_KEY}"
     try:
-        response = requests.get(request_url)
+        response = get_session().get(
+            _currency_exchange_url(), timeout=tool_timeout("get_currency_exchange")
+        )
         data = response.json()["Realtime Currency Exchange Rate"]
     except Exception as e:
-        data = {
-            "2. From_Currency Name": "United States Dollar",
-            "4. To_Currency Name": "South Korean Won",
-            "5. Exchange Rate": "1366.77000000",
-            "6. Last Refreshed": "2025-07-07 11:23:32",
-        }
+        # Not a real quote, so it must not be cached as one.
+        return Uncached(_format_exchange_rate(FALLBACK_EXCHANGE_RATE))
+    return _format_exchange_rate(data)
 
-    to_return = f"""
-    The exchange rate from {data["2. From_Currency Name"]} to {data["4. To_Currency Name"]} is {data["5. Exchange Rate"]} as of {data["6. Last Refreshed"]}.
-    """
 
-    return to_return.strip()
+@async_implementation(get_currency_exchange)
+@cached_tool(ttl=60, name="get_currency_exchange")
+async def aget_currency_exchange(src_currency: str, tgt_currency: str):
+    try:
+        response = await get_async_client().get(
+            _currency_exchange_url(),
+            timeout=tool_httpx_timeout("get_currency_exchange"),
+        )
+        data = response.json()["Realtime Currency Exchange Rate"]
+    except Exception as e:
+        # Not a real quote, so it must not be cached as one.
+        return Uncached(_format_exchange_rate(FALLBACK_EXCHANGE_RATE))
+    return _format_exchange_rate(data)
+
+
+# Client libraries behind each tool, imported on first use.
+TOOL_MODULES = {
+    "web_search_duckduckgo": ("langchain_community.tools",),
+    "news_search_duckduckgo": ("langchain_community.tools",),
+    "tavily_search": ("tavily",),
+}
+
+
+def preload_tools(names):
+    """Imports the client libraries of the named tools ahead of use."""
+    for name in names:
+        for module in TOOL_MODULES.get(name, ()):
+            importlib.import_module(module)
 
 
 tool_choices = {
@@ -116,8 +266,7 @@ tool_choices = {
 
 
 if __name__ == "__main__":
-    tavily_client = TavilyClient(api_key=TAVILY_API_KEY)
-    response = tavily_client.search("대한민국 대통령")
+    response = _get_tavily_client().search("대한민국 대통령")
 
     retrieved = ""
     for result in response["results"]: